@@ -0,0 +1,273 @@
+"""
+Model analysis in a pool of forked worker processes
+
+The Hugging Face model's forward pass is the expensive, GIL-holding part of
+analysing a chat message. Chat turns call analyze_with_model(), which sends
+the message to a worker and falls back to the model manager's keyword
+analysis, run inline, when the pool is saturated, slow or broken.
+
+Model analysis of chat messages is opt-in (CHAT_MODEL_ANALYSIS=1); it adds
+a ``model_analysis`` field to the chat replies. With it off, or with only
+the keyword engines available (no model files, or the model could not be
+loaded), the pool stays off: forking workers to run microsecond keyword
+lookups costs more than it saves.
+
+start_analysis_pool() is called once per process at startup (app import,
+create_app, ASGI lifespan startup) and returns right away. The workers are
+forked when the model has finished loading, so they inherit its weights
+copy-on-write; until then chat turns get the keyword analysis inline. The
+model is still loaded as HF_MODEL_LOAD says: with the default "lazy" mode,
+on the first analysis. A process forked from one whose pool was running
+(e.g. gunicorn --preload workers) starts without one; call
+start_analysis_pool() from gunicorn's post_fork hook.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+
+from engine_registry import get_engine
+
+logger = logging.getLogger(__name__)
+
+# Analysis engines by name. Set in the parent before the workers are forked,
+# so every worker inherits them (model weights included) copy-on-write.
+_engines: Dict[str, Any] = {}
+
+
+def _init_worker():
+    for engine in _engines.values():
+        # e.g. HuggingFaceModelManager drops its batching thread, which did
+        # not survive the fork
+        after_fork = getattr(engine, "after_fork", None)
+        if after_fork is not None:
+            after_fork()
+
+
+def _current(engines: Dict[str, Any], name: str):
+    """engines[name], replaced first if it was built from an older knowledge base"""
+    engine = engines[name]
+    refreshed = getattr(engine, "refreshed", None)
+    if refreshed is not None:
+        engine = engines[name] = refreshed()
+    return engine
+
+
+def _call(engine: str, method: str, args, kwargs):
+    return getattr(_current(_engines, engine), method)(*args, **kwargs)
+
+
+def _ping():
+    return os.getpid()
+
+
+class AnalysisPool:
+    """
+    Runs CPU-bound analysis in a pool of forked worker processes so it does
+    not hold the GIL of the web worker.
+
+    ``start(engines)`` forks the workers; ``engines`` maps names to objects
+    whose methods are called in the workers. At most ``max_pending`` calls
+    are queued or running; a caller that cannot get a slot within
+    ``submit_timeout`` seconds, or whose result takes longer than
+    ``timeout`` seconds, gets its ``fallback`` instead. Until the pool is
+    started (or with ``workers=0``, or without the fork start method) every
+    call gets the fallback.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 timeout: float = 5.0, submit_timeout: float = 0.1):
+        self.engines: Dict[str, Any] = {}
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = max_pending or self.workers * 4
+        self.timeout = timeout
+        self.submit_timeout = submit_timeout
+        self.enabled = self.workers > 0 and "fork" in multiprocessing.get_all_start_methods()
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(max(self.max_pending, 1))
+        self._lock = threading.Lock()
+
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+
+    def start(self, engines: Dict[str, Any]):
+        """Fork the workers with ``engines`` loaded (no-op if disabled or already running)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._executor is not None:
+                return
+            self.engines = dict(engines)
+            _engines.clear()
+            _engines.update(self.engines)
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_init_worker
+            )
+            # With fork, the first submit starts every worker at once
+            self._executor.submit(_ping).result()
+            logger.info(f"Analysis pool started with {self.workers} workers for {', '.join(self.engines)}")
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self, engine: str, method: str, *args, fallback: Callable[[], Any], **kwargs):
+        """Call ``engines[engine].method(*args, **kwargs)`` in a worker process, or ``fallback()``"""
+        executor = self._executor
+        if executor is None:
+            return fallback()
+
+        if not self._slots.acquire(timeout=self.submit_timeout):
+            self.rejected += 1
+            logger.warning(f"Analysis pool saturated; using fallback for {engine}.{method}")
+            return fallback()
+
+        try:
+            future = executor.submit(_call, engine, method, args, kwargs)
+        except Exception as e:
+            self._slots.release()
+            self._broken(e)
+            return fallback()
+        # The slot is held until the worker finishes, even if we stop waiting
+        future.add_done_callback(lambda _: self._slots.release())
+
+        try:
+            result = future.result(timeout=self.timeout)
+        except TimeoutError:
+            self.timeouts += 1
+            logger.warning(f"{engine}.{method} timed out after {self.timeout}s; using fallback")
+            return fallback()
+        except BrokenProcessPool as e:
+            self._broken(e)
+            return fallback()
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"{engine}.{method} failed in analysis pool: {e}")
+            return fallback()
+
+        self.completed += 1
+        return result
+
+    def _broken(self, error: Exception):
+        """Discard a broken pool; later calls use their fallback until it is restarted"""
+        self.failures += 1
+        logger.error(f"Analysis pool unavailable: {error}")
+        self.shutdown()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "engines": list(self.engines),
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "timeout": self.timeout,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+        }
+
+
+_pool: Optional[AnalysisPool] = None
+_pool_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # The executor's threads and pipes belong to the parent
+    global _pool, _pool_lock
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_analysis_pool() -> AnalysisPool:
+    """This process's pool (ANALYSIS_POOL_WORKERS, ANALYSIS_TIMEOUT); not started until start_analysis_pool()"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = AnalysisPool(
+                    workers=int(os.environ['ANALYSIS_POOL_WORKERS']) if 'ANALYSIS_POOL_WORKERS' in os.environ else None,
+                    timeout=float(os.environ.get('ANALYSIS_TIMEOUT', 5))
+                )
+    return _pool
+
+
+def model_analysis_enabled() -> bool:
+    return os.environ.get('CHAT_MODEL_ANALYSIS', '0') != '0'
+
+
+def start_analysis_pool() -> AnalysisPool:
+    """
+    Fork the pool's workers once the model has loaded; call once at startup.
+    Does not wait for the model. The pool stays off when there is no model
+    to run (keyword engines only) or model analysis is disabled.
+    """
+    pool = get_analysis_pool()
+    if not pool.enabled or pool.running or not model_analysis_enabled():
+        return pool
+    model = get_engine('model_manager')
+    if not model.has_model_files():
+        logger.info("No model files; analysis pool off, keyword analysis runs inline")
+        return pool
+    # Runs on the loader thread when loading finishes, so the workers are
+    # forked with the weights in memory and share them
+    model.on_loaded(lambda: _start_with_model(pool, model))
+    return pool
+
+
+def _start_with_model(pool: AnalysisPool, model):
+    if not model.model_loaded:
+        logger.info(f"Model {model.load_state}; analysis pool off, keyword analysis runs inline")
+        return
+    pool.start({'model': model})
+
+
+def analyze_with_model(text: str) -> Optional[Dict[str, Any]]:
+    """
+    Model analysis of a chat message, or None when model analysis is
+    disabled or there is no model.
+
+    Runs in a pool worker when the pool is running; when it is saturated,
+    slow or broken, the model manager's keyword analysis runs inline
+    instead. Without a running pool (ANALYSIS_POOL_WORKERS=0, the model
+    still loading, or not started in this process) the model manager runs
+    inline: the first call starts a lazy load, and the keyword analysis is
+    returned until the model is ready.
+    """
+    if not model_analysis_enabled():
+        return None
+    pool = get_analysis_pool()
+    if pool.running:
+        model = pool.engines['model']
+        return pool.run('model', 'analyze_symptoms', text, fallback=lambda: model.keyword_analysis(text))
+    model = get_engine('model_manager')
+    if not model.has_model_files():
+        return None
+    return model.analyze_symptoms(text)
+
+
+def model_analysis_fields(ai_response: Dict[str, Any]) -> Dict[str, Any]:
+    """``{'model_analysis': ...}`` for a chat reply that has one, else nothing"""
+    if 'model_analysis' in ai_response:
+        return {'model_analysis': ai_response['model_analysis']}
+    return {}
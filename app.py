@@ -1,10 +1,20 @@
-from flask import Flask, render_template, request, jsonify, session, flash, redirect, url_for
-from flask_sqlalchemy import SQLAlchemy
+from flask import Flask, render_template, request, jsonify, session, flash, redirect, url_for, stream_with_context
 from flask_login import LoginManager, current_user, login_user, logout_user, login_required
 import json
+import secrets
 import uuid
 from datetime import datetime
 from forms import LoginForm, RegistrationForm
+from symptom_matcher import PhraseMatcher
+from response_templates import DiagnosisTemplates
+from knowledge_base import get_knowledge_base
+from sse import StreamError, sse_response, stream_reply
+from analysis_pool import analyze_with_model, model_analysis_fields, start_analysis_pool
+from engine_registry import get_engine, registry
+from session_store import create_history_store
+from extensions import db
+from db_profiles import init_db
+from models import User
 
 # Create Flask app
 app = Flask(__name__)
@@ -15,108 +25,25 @@ app.config['SESSION_COOKIE_SECURE'] = False  # Set to True in production with HT
 app.config['SESSION_COOKIE_HTTPONLY'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 
-# Initialize extensions
-db = SQLAlchemy(app)
+# Initialize extensions (DB_PROFILE=sqlite-prod enables WAL and a thread-safe pool)
+init_db(app, db)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
-# Simple User class for now
-class User:
-    def __init__(self, id, email, first_name, last_name, age, gender):
-        self.id = id
-        self.email = email
-        self.first_name = first_name
-        self.last_name = last_name
-        self.age = age
-        self.gender = gender
-        self.password_hash = None
-        self.created_at = datetime.utcnow()
-        self.last_login = None
-        self.free_consultations_used = 0
-        self.subscription_status = 'free'
-        self.subscription_expires = None
-    
-    def set_password(self, password):
-        from werkzeug.security import generate_password_hash
-        self.password_hash = generate_password_hash(password)
-    
-    def check_password(self, password):
-        from werkzeug.security import check_password_hash
-        return check_password_hash(self.password_hash, password)
-    
-    def is_authenticated(self):
-        return True
-    
-    def is_active(self):
-        return True
-    
-    def is_anonymous(self):
-        return False
-    
-    def get_id(self):
-        return str(self.id)
-    
-    def has_active_subscription(self):
-        """Check if user has an active subscription"""
-        if self.subscription_status == 'premium' and self.subscription_expires:
-            return datetime.utcnow() < self.subscription_expires
-        return False
-    
-    def can_use_free_consultation(self):
-        """Check if user can still use free consultation"""
-        return self.free_consultations_used < 1
-
-# Simple file-based storage for users (persists between restarts)
-import os
-import pickle
-
-USERS_FILE = 'users_data.pkl'
-
-def load_users():
-    """Load users from file"""
-    if os.path.exists(USERS_FILE):
-        try:
-            with open(USERS_FILE, 'rb') as f:
-                data = pickle.load(f)
-                users = data.get('users', {})
-                counter = data.get('counter', 1)
-                print(f"✅ Loaded {len(users)} users from file")
-                return users, counter
-        except Exception as e:
-            print(f"⚠️ Error loading users: {e}")
-            return {}, 1
-    print("📝 No users file found, starting fresh")
-    return {}, 1
-
-def save_users(users_db, user_id_counter):
-    """Save users to file"""
-    try:
-        data = {'users': users_db, 'counter': user_id_counter}
-        with open(USERS_FILE, 'wb') as f:
-            pickle.dump(data, f)
-    except Exception as e:
-        print(f"Warning: Could not save users data: {e}")
-
-# Load existing users
-users_db, user_id_counter = load_users()
-
+# Users live in the SQL ``user`` table (see models.User). Existing accounts
+# from users_data.pkl can be loaded once with ``python import_users.py``.
 def create_user(email, first_name, last_name, age, gender, password):
-    global user_id_counter
-    user = User(user_id_counter, email, first_name, last_name, age, gender)
+    user = User(email=email, first_name=first_name, last_name=last_name, age=age, gender=gender)
     user.set_password(password)
-    users_db[email] = user
-    user_id_counter += 1
-    save_users(users_db, user_id_counter)  # Save to file
+    db.session.add(user)
+    db.session.commit()
     return user
 
 def get_user_by_email(email):
-    return users_db.get(email)
+    return User.query.filter_by(email=email).first()
 
 def get_user_by_id(user_id):
-    for user in users_db.values():
-        if user.id == user_id:
-            return user
-    return None
+    return db.session.get(User, user_id)
 
 # User loader function for Flask-Login
 @login_manager.user_loader
@@ -130,131 +57,54 @@ with app.app_context():
 
 # AI Doctor Chatbot Logic
 class AIDoctor:
-    def __init__(self):
-        self.symptom_database = {
-            'fever': {
-                'diseases': ['Common Cold', 'Flu', 'COVID-19', 'Bacterial Infection'],
-                'prescription': 'MEDICATIONS: Acetaminophen (Tylenol) 500-1000mg every 6-8 hours OR Ibuprofen (Advil) 200-400mg every 6-8 hours. Also: Rest, fluids, monitor temperature.',
-                'severity': 'moderate'
-            },
-            'headache': {
-                'diseases': ['Tension Headache', 'Migraine', 'Sinusitis', 'Dehydration'],
-                'prescription': 'MEDICATIONS: Acetaminophen (Tylenol) 500-1000mg OR Ibuprofen (Advil) 200-400mg OR Aspirin 325-650mg. Also: Rest in quiet room, hydration.',
-                'severity': 'mild'
-            },
-            'cough': {
-                'diseases': ['Upper Respiratory Infection', 'Bronchitis', 'Allergies', 'Post-nasal drip'],
-                'prescription': 'MEDICATIONS: Dextromethorphan (Robitussin DM) 15-30mg every 4-6 hours OR Guaifenesin (Mucinex) 200-400mg every 4 hours. Also: Honey, warm fluids, humidifier.',
-                'severity': 'mild'
-            },
-            'fatigue': {
-                'diseases': ['Stress', 'Anemia', 'Sleep disorder', 'Chronic fatigue'],
-                'prescription': 'MEDICATIONS: Consider Vitamin B12 1000mcg daily OR Iron supplement if anemic. Also: Ensure 7-9 hours sleep, balanced diet, regular exercise.',
-                'severity': 'mild'
-            },
-            'nausea': {
-                'diseases': ['Gastritis', 'Food poisoning', 'Motion sickness', 'Anxiety'],
-                'prescription': 'MEDICATIONS: Dimenhydrinate (Dramamine) 25-50mg every 4-6 hours OR Meclizine (Bonine) 25mg daily. Also: Small meals, ginger tea, avoid spicy foods.',
-                'severity': 'moderate'
-            },
-            'chest_pain': {
-                'diseases': ['Costochondritis', 'Muscle strain', 'Anxiety', 'Heart condition'],
-                'prescription': 'MEDICATIONS: Ibuprofen (Advil) 200-400mg every 6-8 hours OR Naproxen (Aleve) 220mg every 8-12 hours. Also: Rest, avoid heavy lifting, warm compress.',
-                'severity': 'moderate'
-            },
-            'sore_throat': {
-                'diseases': ['Pharyngitis', 'Strep throat', 'Viral infection', 'Allergies'],
-                'prescription': 'MEDICATIONS: Acetaminophen (Tylenol) 500-1000mg every 6-8 hours OR Ibuprofen (Advil) 200-400mg every 6-8 hours. Also: Warm salt water gargles, throat lozenges.',
-                'severity': 'mild'
-            },
-            'runny_nose': {
-                'diseases': ['Common Cold', 'Allergies', 'Sinusitis', 'Flu'],
-                'prescription': 'MEDICATIONS: Pseudoephedrine (Sudafed) 30-60mg every 4-6 hours OR Loratadine (Claritin) 10mg daily for allergies. Also: Nasal saline spray, rest, fluids.',
-                'severity': 'mild'
-            },
-            'muscle_aches': {
-                'diseases': ['Viral infection', 'Overexertion', 'Flu', 'Stress'],
-                'prescription': 'MEDICATIONS: Ibuprofen (Advil) 200-400mg every 6-8 hours OR Acetaminophen (Tylenol) 500-1000mg every 6-8 hours. Also: Rest, warm compress, gentle stretching.',
-                'severity': 'mild'
-            },
-            'vaginal_discharge': {
-                'diseases': ['Yeast infection', 'Bacterial vaginosis', 'STI', 'Hormonal changes'],
-                'prescription': 'MEDICATIONS: For yeast infection: Clotrimazole (Gyne-Lotrimin) cream OR Fluconazole (Diflucan) 150mg single dose. Also: Maintain good hygiene, avoid douching, wear cotton underwear.',
-                'severity': 'moderate'
-            },
-            'dizziness': {
-                'diseases': ['Vertigo', 'Low blood pressure', 'Dehydration', 'Inner ear problems'],
-                'prescription': 'MEDICATIONS: Meclizine (Bonine) 25mg daily for vertigo OR Dimenhydrinate (Dramamine) 25-50mg as needed. Also: Stay hydrated, avoid sudden movements, rest.',
-                'severity': 'moderate'
-            },
-            'stomachache': {
-                'diseases': ['Gastritis', 'Indigestion', 'Food poisoning', 'IBS'],
-                'prescription': 'MEDICATIONS: Antacids (Tums, Rolaids) OR Famotidine (Pepcid) 20mg twice daily OR Omeprazole (Prilosec) 20mg daily. Also: Avoid spicy foods, eat small meals, stay hydrated.',
-                'severity': 'mild'
-            },
-            'back_pain': {
-                'diseases': ['Muscle strain', 'Herniated disc', 'Arthritis', 'Poor posture'],
-                'prescription': 'MEDICATIONS: Ibuprofen (Advil) 200-400mg every 6-8 hours OR Naproxen (Aleve) 220mg every 8-12 hours. Also: Rest, ice/heat therapy, gentle stretching, proper posture.',
-                'severity': 'moderate'
-            },
-            'diarrhea': {
-                'diseases': ['Viral gastroenteritis', 'Food poisoning', 'IBS', 'Medication side effect'],
-                'prescription': 'MEDICATIONS: Loperamide (Imodium) 2mg after each loose stool (max 8mg/day) OR Bismuth subsalicylate (Pepto-Bismol). Also: Stay hydrated, BRAT diet (bananas, rice, applesauce, toast).',
-                'severity': 'moderate'
-            }
-        }
+    def __init__(self, knowledge_base=None):
+        # Symptoms, diseases and prescriptions from data/knowledge_base.json
+        self.knowledge_base = knowledge_base or get_knowledge_base()
+        self.symptom_database = self.knowledge_base.diagnosis['symptom_database']
+        
+        # Variations and related terms for each symptom
+        self.symptom_variations = self.knowledge_base.diagnosis['symptom_variations']
+        
+        # Built once per knowledge base version and shared by every instance
+        self.symptom_matcher = self.knowledge_base.derived('diagnosis.symptom_matcher', self._build_symptom_matcher)
+        self.templates = self.knowledge_base.derived(
+            'diagnosis.templates', lambda: DiagnosisTemplates(self.symptom_database)
+        )
+    
+    def refreshed(self):
+        """This doctor, or a new one if the knowledge base has changed since it was built"""
+        knowledge_base = get_knowledge_base()
+        return self if knowledge_base is self.knowledge_base else type(self)(knowledge_base)
+    
+    def _build_symptom_matcher(self):
+        """Compile symptom keys and variations into a single matcher"""
+        phrases = {}
+        for rank, symptom_key in enumerate(self.symptom_database):
+            phrases.setdefault(symptom_key, set()).add((rank, symptom_key))
+        
+        offset = len(self.symptom_database)
+        for rank, (symptom_key, variations) in enumerate(self.symptom_variations.items(), offset):
+            for variation in variations:
+                phrases.setdefault(variation, set()).add((rank, symptom_key))
+        
+        return PhraseMatcher(phrases)
     
     def analyze_symptoms(self, symptoms_text):
         """Analyze symptoms and return diagnosis"""
+        # Diagnosis of the most severe symptom, by numeric severity rank
+        return self.templates.diagnosis(self._match_symptoms(symptoms_text))
+    
+    def _match_symptoms(self, symptoms_text):
+        """Symptom keys mentioned in the text, in match order"""
         symptoms_text = symptoms_text.lower()
-        matched_symptoms = []
         
-        # Check for symptom keywords in the text (not just exact word matches)
-        for symptom_key, symptom_data in self.symptom_database.items():
-            if symptom_key in symptoms_text:
+        # One pass over the text finds every symptom key and variation;
+        # ranks keep the order of direct key matches before variation matches
+        matched_symptoms = []
+        for rank, symptom_key in sorted(self.symptom_matcher.find(symptoms_text)):
+            if symptom_key not in matched_symptoms:
                 matched_symptoms.append(symptom_key)
-        
-        # Also check for variations and related terms
-        symptom_variations = {
-            'headache': ['head', 'head ache', 'migraine', 'head pain', 'headache', 'headaches'],
-            'cough': ['coughing', 'hack', 'hacking', 'cough', 'coughs'],
-            'chest_pain': ['chest', 'chest pain', 'chest ache', 'rib pain', 'ribs', 'boob', 'breast pain', 'chest hurts', 'chest discomfort'],
-            'fever': ['temperature', 'hot', 'burning up', 'fever', 'feverish'],
-            'fatigue': ['tired', 'exhausted', 'weak', 'lethargic', 'fatigue', 'fatigued'],
-            'nausea': ['sick', 'queasy', 'vomit', 'throwing up', 'nausea', 'nauseous'],
-            'sore_throat': ['throat', 'sore throat', 'throat pain', 'throat hurts', 'throat ache'],
-            'runny_nose': ['nose', 'runny nose', 'stuffy nose', 'nasal', 'congestion'],
-            'muscle_aches': ['muscle', 'muscle pain', 'muscle ache', 'body ache', 'body pain', 'aching'],
-            'vaginal_discharge': ['discharge', 'vaginal discharge', 'yeast infection', 'bacterial vaginosis', 'vaginal itching'],
-            'dizziness': ['dizzy', 'dizziness', 'vertigo', 'lightheaded', 'lightheadedness', 'spinning'],
-            'stomachache': ['stomach', 'stomach pain', 'stomach ache', 'stomachache', 'abdominal pain', 'belly pain', 'tummy pain'],
-            'back_pain': ['back', 'back pain', 'back ache', 'lower back', 'upper back', 'spine pain'],
-            'diarrhea': ['diarrhea', 'diarrhoea', 'loose stools', 'watery stools', 'bowel movement', 'stomach upset']
-        }
-        
-        for symptom_key, variations in symptom_variations.items():
-            if any(var in symptoms_text for var in variations):
-                if symptom_key not in matched_symptoms:
-                    matched_symptoms.append(symptom_key)
-        
-        if matched_symptoms:
-            # Get the most severe symptom
-            most_severe = max(matched_symptoms, key=lambda x: self.symptom_database[x]['severity'])
-            diagnosis = self.symptom_database[most_severe]
-            
-            return {
-                'disease': diagnosis['diseases'][0],
-                'prescription': diagnosis['prescription'],
-                'severity': diagnosis['severity'],
-                'matched_symptoms': matched_symptoms
-            }
-        else:
-            return {
-                'disease': 'General Consultation Needed',
-                'prescription': 'Please provide more specific symptoms or consult a healthcare provider.',
-                'severity': 'unknown',
-                'matched_symptoms': []
-            }
+        return matched_symptoms
     
     def get_response(self, user_message, chat_history=None, is_first_consultation=False):
         """Generate AI doctor response"""
@@ -269,13 +119,13 @@ class AIDoctor:
             }
         
         # Handle symptom descriptions - check if any known symptoms are mentioned
-        diagnosis = self.analyze_symptoms(user_message)
+        matched_symptoms = self._match_symptoms(user_message)
         
         # If we found symptoms, provide diagnosis and prescription
-        if diagnosis['matched_symptoms']:
-            symptoms_list = ', '.join(diagnosis['matched_symptoms']).replace('_', ' ')
+        if matched_symptoms:
+            diagnosis, response = self.templates.render(matched_symptoms)
             return {
-                'response': f"I understand you're experiencing {symptoms_list}. Based on your symptoms, you may be experiencing **{diagnosis['disease']}**.\n\n**My Prescription:**\n{diagnosis['prescription']}\n\nWould you like me to explain the dosage or any side effects?\n\n**Important:** This is for informational purposes only and should not replace professional medical advice. If symptoms persist or worsen, please consult with a healthcare provider.",
+                'response': response,
                 'type': 'diagnosis',
                 'diagnosis': diagnosis,
                 'requires_payment': True
@@ -283,8 +133,9 @@ class AIDoctor:
         
         # Check for general symptom indicators
         if any(word in user_message for word in ['symptom', 'feel', 'pain', 'hurt', 'sick', 'unwell', 'ache', 'sore', 'discharge', 'dizzy', 'stomach', 'nauseous']):
+            diagnosis, response = self.templates.general()
             return {
-                'response': f"I can see you're not feeling well. Based on what you've described, you may be experiencing **{diagnosis['disease']}**.\n\n**My Prescription:**\n{diagnosis['prescription']}\n\nWould you like me to explain the dosage or any side effects?\n\n**Important:** This is for informational purposes only and should not replace professional medical advice. If symptoms persist or worsen, please consult with a healthcare provider.",
+                'response': response,
                 'type': 'diagnosis',
                 'diagnosis': diagnosis,
                 'requires_payment': True
@@ -329,8 +180,24 @@ class AIDoctor:
             'requires_payment': False
         }
 
-# Initialize AI Doctor
-ai_doctor = AIDoctor()
+# Initialize AI Doctor (one per process, shared through the engine registry)
+registry.register('diagnosis', AIDoctor)
+ai_doctor = get_engine('diagnosis')
+
+# Model analysis (CHAT_MODEL_ANALYSIS=1) runs in forked worker processes,
+# forked once the model has loaded; off when only the keyword engines are in use
+start_analysis_pool()
+
+# Chat history lives server-side (SQLite by default, Redis via CHAT_HISTORY_STORE)
+history_store = create_history_store()
+
+def get_chat_session_id():
+    """Id of this browser's chat history, created on first use"""
+    # History used to be kept in the cookie itself; drop it
+    session.pop('chat_history', None)
+    if 'chat_session_id' not in session:
+        session['chat_session_id'] = secrets.token_urlsafe(16)
+    return session['chat_session_id']
 
 # Add custom Jinja2 filter for JSON parsing
 @app.template_filter('from_json')
@@ -357,7 +224,6 @@ def login():
         password = request.form.get('password')
         
         print(f"🔍 Login attempt for: {email}")
-        print(f"📊 Total users in database: {len(users_db)}")
         
         user = get_user_by_email(email)
         
@@ -460,58 +326,130 @@ def ai_doctor_page():
     
     return render_template('ai_doctor.html')
 
-@app.route('/ai_doctor/chat', methods=['POST'])
-def ai_doctor_chat():
-    """Handle AI Doctor chat requests"""
+def read_chat_message():
+    """The posted chat message; returns (message, error) with error as (body, status)"""
     if not current_user.is_authenticated:
-        return jsonify({'error': 'Please log in to use AI Doctor'}), 401
+        return None, ({'error': 'Please log in to use AI Doctor'}, 401)
     
     data = request.get_json()
     user_message = data.get('message', '')
     
     if not user_message:
-        return jsonify({'error': 'No message provided'}), 400
-    
+        return None, ({'error': 'No message provided'}, 400)
+    return user_message, None
+
+def answer_chat_message(user_message, chat_session_id):
+    """Run one AI Doctor chat turn; returns (ai_response, error) with error as (body, status)"""
     # Get AI response
     ai_response = ai_doctor.get_response(user_message)
+    model_analysis = analyze_with_model(user_message)
+    if model_analysis is not None:
+        ai_response = dict(ai_response, model_analysis=model_analysis)
     
     # Check if this response requires payment (diagnosis/prescription)
     if ai_response.get('requires_payment', False):
+        # When streaming, this runs after the request's session was removed
+        # and current_user is detached; work on the copy in the live session
+        user = db.session.get(User, current_user.id)
+        
         # Check if user has used their free consultation
-        if not current_user.can_use_free_consultation() and not current_user.has_active_subscription():
-            return jsonify({
+        if not user.can_use_free_consultation() and not user.has_active_subscription():
+            return None, ({
                 'error': 'You have used your free consultation. Please complete payment to proceed with your treatment.',
                 'redirect': url_for('pricing'),
                 'payment_required': True
-            }), 402
+            }, 402)
         
         # If this is a diagnosis (prescription), mark free consultation as used
-        if current_user.can_use_free_consultation():
-            current_user.free_consultations_used += 1
-            save_users(users_db, user_id_counter)  # Save the updated user data
-            print(f"🎯 User {current_user.email} used their free consultation")
+        if user.can_use_free_consultation():
+            user.free_consultations_used += 1
+            db.session.commit()  # Save the updated user data
+            print(f"🎯 User {user.email} used their free consultation")
     
-    # Save to session for history (in a real app, this would go to database)
-    if 'chat_history' not in session:
-        session['chat_history'] = []
-    
-    session['chat_history'].append({
+    # Append the exchange to the server-side history; the cookie only
+    # carries the chat session id
+    history_store.append(chat_session_id, {
         'user': user_message,
         'ai': ai_response['response'],
         'timestamp': datetime.now().isoformat()
     })
     
+    return ai_response, None
+
+@app.route('/ai_doctor/chat', methods=['POST'])
+def ai_doctor_chat():
+    """Handle AI Doctor chat requests"""
+    user_message, error = read_chat_message()
+    if not error:
+        ai_response, error = answer_chat_message(user_message, get_chat_session_id())
+    if error:
+        body, status = error
+        return jsonify(body), status
+    
     return jsonify({
         'response': ai_response['response'],
         'type': ai_response['type'],
         'diagnosis': ai_response.get('diagnosis', None),
+        **model_analysis_fields(ai_response),
         'payment_required': False
     })
 
+@app.route('/ai_doctor/chat/stream', methods=['POST'])
+def ai_doctor_chat_stream():
+    """Handle AI Doctor chat requests, streaming the reply as Server-Sent Events"""
+    user_message, error = read_chat_message()
+    if error:
+        body, status = error
+        return jsonify(body), status
+    # The session cookie is sent with the headers, so the chat session id
+    # is settled before streaming starts
+    chat_session_id = get_chat_session_id()
+    
+    def produce():
+        # Runs after the meta event is sent; payment problems become an
+        # ``error`` event since the status code has already gone out
+        ai_response, error = answer_chat_message(user_message, chat_session_id)
+        if error:
+            raise StreamError(error[0])
+        return ai_response['response'], {
+            'type': ai_response['type'],
+            'diagnosis': ai_response.get('diagnosis', None),
+            **model_analysis_fields(ai_response),
+            'payment_required': False
+        }
+    
+    return sse_response(stream_with_context(stream_reply({'success': True}, produce)))
+
+@app.route('/ai_doctor/ready')
+def ai_doctor_ready():
+    """Readiness probe for load balancers: the model's load state only; 503 while it is loading"""
+    state = get_engine('model_manager').load_state
+    return jsonify({'state': state}), 503 if state == 'loading' else 200
+
+@app.route('/ai_doctor/model-status')
+@login_required
+def ai_doctor_model_status():
+    """Load progress of the optional Hugging Face model; 503 while it is loading"""
+    status = get_engine('model_manager').get_model_info()
+    return jsonify(status), 503 if status['load_state'] == 'loading' else 200
+
+@app.route('/ai_doctor/engines')
+@login_required
+def ai_doctor_engines():
+    """Construction time and memory of the shared engines in this worker"""
+    return jsonify(registry.get_stats())
+
 @app.route('/ai_doctor/history')
 def ai_doctor_history():
-    """Get chat history"""
-    return jsonify(session.get('chat_history', []))
+    """Get a page of chat history; pass next_cursor back as ?after= for the next page"""
+    session_id = session.get('chat_session_id')
+    if not session_id:
+        return jsonify({'history': [], 'next_cursor': None})
+    
+    after = request.args.get('after', 0, type=int)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    entries, next_cursor = history_store.page(session_id, after=after, limit=limit)
+    return jsonify({'history': entries, 'next_cursor': next_cursor})
 
 @app.route('/history')
 def history_list():
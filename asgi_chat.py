@@ -0,0 +1,337 @@
+"""
+Asynchronous (ASGI) serving mode for the AI doctor chat endpoints
+
+Serves /ai-doctor/start-chat, /ai-doctor/send-message and
+/ai-doctor/get-history/<session_id> with the same request and response
+bodies as the Flask views in routes.py. Database access goes through
+SQLAlchemy's async engine and the doctor engine is awaited through an
+executor, so a waiting client costs a coroutine instead of a thread.
+
+Turns of one chat session are answered one at a time. Conversation contexts
+are cached per process, like routes.py's, and checked against the stored
+user message count on every turn, so turns answered by the Flask workers
+are picked up once they are committed. Turns here are committed before the
+reply is returned. Turns still queued in a Flask worker's write-behind
+writer (at most CHAT_WRITE_INTERVAL_MS) are not seen, so a client should
+send the turns of one session to one of the two apps.
+
+Users are authenticated from the Flask session cookie (same SESSION_SECRET),
+so a browser logged in to the Flask app can call these endpoints directly.
+Run it next to the Flask app, e.g. behind a proxy that routes /ai-doctor/*:
+
+    uvicorn asgi_chat:app --port 5001
+"""
+
+import asyncio
+import json
+import os
+import re
+import uuid
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.cookies import SimpleCookie
+from typing import Dict, Optional
+from flask import Flask
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from analysis_pool import analyze_with_model, get_analysis_pool, model_analysis_fields, start_analysis_pool
+from chat_context import ChatContextCache
+from db_profiles import apply_sqlite_pragmas, get_profile, is_sqlite
+from engine_registry import get_engine
+from models import ChatMessage, ChatSession, User
+
+WELCOME_MESSAGE = (
+    "Hello! I'm Dr. Sarah Chen, your AI medical assistant. How can I help you today? "
+    "Please describe your symptoms or ask any health-related questions."
+)
+
+# Async drivers for the sync URLs the Flask app is configured with
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'postgres': 'postgresql+asyncpg',
+    'mysql': 'mysql+aiomysql',
+}
+
+INSTANCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+
+
+def async_database_url(url: str) -> str:
+    """Turn the Flask app's DATABASE_URL into the matching async driver URL"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if parsed.drivername in ASYNC_DRIVERS:
+        parsed = parsed.set(drivername=ASYNC_DRIVERS[parsed.drivername])
+    if backend == 'sqlite' and parsed.database and parsed.database != ':memory:' \
+            and not os.path.isabs(parsed.database):
+        # Flask-SQLAlchemy resolves relative SQLite paths against the instance folder
+        parsed = parsed.set(database=os.path.join(INSTANCE_PATH, parsed.database))
+    return parsed.render_as_string(hide_password=False)
+
+
+class Request:
+    def __init__(self, scope, body: bytes):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                        for name, value in scope.get('headers', [])}
+        self.body = body
+
+    @property
+    def cookies(self) -> Dict[str, str]:
+        cookie = SimpleCookie()
+        cookie.load(self.headers.get('cookie', ''))
+        return {key: morsel.value for key, morsel in cookie.items()}
+
+    def get_json(self) -> Optional[Dict]:
+        try:
+            data = json.loads(self.body or b'null')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+
+
+class AsyncChatApp:
+    """ASGI application for the chat endpoints"""
+
+    def __init__(self, database_url: Optional[str] = None, secret_key: Optional[str] = None,
+                 executor_workers: Optional[int] = None):
+        database_url = database_url or os.environ.get('DATABASE_URL', 'sqlite:///health_assistant.db')
+        self.engine = create_async_engine(async_database_url(database_url))
+        if get_profile() == 'sqlite-prod' and is_sqlite(database_url):
+            # Same pragmas as the Flask app's engine (see db_profiles.py)
+            apply_sqlite_pragmas(self.engine.sync_engine)
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+
+        # Flask's own cookie serializer, so sessions signed by the Flask app verify here
+        flask_app = Flask(__name__)
+        flask_app.secret_key = secret_key or os.environ.get('SESSION_SECRET', 'dev-secret-key-change-in-production')
+        self.session_cookie_name = flask_app.config['SESSION_COOKIE_NAME']
+        self.session_max_age = int(flask_app.permanent_session_lifetime.total_seconds())
+        self.session_serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+
+        self.doctor = get_engine('doctor')
+        try:
+            self.payment_service = get_engine('payment_service')
+        except Exception as e:
+            print(f"Error creating payment service: {e}")
+            self.payment_service = None
+
+        # Analysis blocks a thread (inline, or waiting on a pool process),
+        # never the event loop
+        self.executor = ThreadPoolExecutor(
+            max_workers=executor_workers or int(os.environ.get('ASGI_EXECUTOR_WORKERS', 32)),
+            thread_name_prefix='chat-analysis'
+        )
+        self.chat_contexts = ChatContextCache(
+            max_sessions=int(os.environ.get('CHAT_CONTEXT_CACHE_SIZE', 10000)),
+            window=int(os.environ.get('CHAT_CONTEXT_WINDOW', 10))
+        )
+        # One lock per chat session with a turn in progress
+        self._session_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+        self.routes = [
+            ('POST', re.compile(r'^/ai-doctor/start-chat$'), self.start_chat),
+            ('POST', re.compile(r'^/ai-doctor/send-message$'), self.send_message),
+            ('GET', re.compile(r'^/ai-doctor/get-history/(?P<session_id>[^/]+)$'), self.get_chat_history),
+        ]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+
+        body = b''
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        request = Request(scope, body)
+
+        for method, pattern, handler in self.routes:
+            match = pattern.match(request.path)
+            if match is None:
+                continue
+            if request.method != method:
+                await self._send_json(send, {'success': False, 'error': 'Method not allowed'}, 405)
+                return
+            user = await self._current_user(request)
+            if user is None:
+                await self._send_json(send, {'success': False, 'error': 'Please log in to use AI Doctor'}, 401)
+                return
+            try:
+                payload, status = await handler(request, user, **match.groupdict())
+            except Exception as e:
+                print(f"Error in {request.path}: {e}")
+                payload, status = {'success': False, 'error': 'Sorry, I encountered an error. Please try again.'}, 500
+            await self._send_json(send, payload, status)
+            return
+
+        await self._send_json(send, {'success': False, 'error': 'Not found'}, 404)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Forks the pool once the model has loaded (right away if it already has)
+                await asyncio.get_running_loop().run_in_executor(None, start_analysis_pool)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.engine.dispose()
+                get_analysis_pool().shutdown()
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def _send_json(send, payload, status=200):
+        body = json.dumps(payload).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _current_user(self, request: Request) -> Optional[User]:
+        """The user Flask-Login stored in the signed session cookie"""
+        cookie = request.cookies.get(self.session_cookie_name)
+        if not cookie:
+            return None
+        try:
+            session = self.session_serializer.loads(cookie, max_age=self.session_max_age)
+            user_id = int(session['_user_id'])
+        except Exception:
+            return None
+        async with self.sessions() as db:
+            return await db.get(User, user_id)
+
+    def _session_lock(self, session_id: str) -> asyncio.Lock:
+        lock = self._session_locks.get(session_id)
+        if lock is None:
+            lock = self._session_locks[session_id] = asyncio.Lock()
+        return lock
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def start_chat(self, request: Request, user: User):
+        # Check payment status
+        if self.payment_service:
+            payment_info = self.payment_service.calculate_consultation_cost(user)
+            if payment_info['payment_required']:
+                return {'success': False, 'payment_required': True, 'message': 'Payment required'}, 200
+
+        # Create chat session with its welcome message
+        session_id = str(uuid.uuid4())
+        async with self.sessions() as db:
+            db.add(ChatSession(user_id=user.id, session_id=session_id, is_active=True))
+            db.add(ChatMessage(session_id=session_id, message_type='ai', content=WELCOME_MESSAGE))
+            await db.commit()
+
+        self.chat_contexts.new(session_id)
+        return {'success': True, 'session_id': session_id}, 200
+
+    async def send_message(self, request: Request, user: User):
+        data = request.get_json() or {}
+        message = (data.get('message') or '').strip()
+        session_id = data.get('session_id')
+        if not message or not session_id:
+            return {'success': False, 'message': 'Invalid request'}, 200
+
+        received_at = datetime.utcnow()
+        # Rebuilt from the new knowledge base after data/knowledge_base.json changes
+        doctor = self.doctor = get_engine('doctor')
+        # The turn updates the cached context, and the next turn's check of
+        # the stored message count must see this one committed
+        async with self._session_lock(session_id):
+            async with self.sessions() as db:
+                context = await self._conversation_context(db, session_id, doctor)
+
+            # No database connection is held while the analysis runs
+            def analyze():
+                context.add_user_message(message, doctor._detect_symptoms(message))
+                ai_response = doctor.get_medical_response(message, context.history(), known_symptoms=list(context.symptoms))
+                model_analysis = analyze_with_model(message)
+                if model_analysis is not None:
+                    ai_response = dict(ai_response, model_analysis=model_analysis)
+                return ai_response
+
+            try:
+                ai_response = await self._run(analyze)
+            except Exception as e:
+                print(f"Error getting AI response: {e}")
+                self.chat_contexts.discard(session_id)  # rebuilt from the DB on the next turn
+                return {'success': False, 'error': 'Sorry, I encountered an error. Please try again.'}, 500
+
+            async with self.sessions() as db:
+                db.add(ChatMessage(session_id=session_id, message_type='user', content=message, timestamp=received_at))
+                db.add(ChatMessage(session_id=session_id, message_type='ai', content=ai_response['response']))
+                chat_session = (await db.execute(
+                    select(ChatSession).filter_by(session_id=session_id)
+                )).scalar_one_or_none()
+                if chat_session:
+                    chat_session.last_activity = datetime.utcnow()
+                await db.commit()
+
+        return {
+            'success': True,
+            'ai_response': ai_response['response'],
+            'medications': ai_response.get('medications', []),
+            'advice': ai_response.get('advice', []),
+            **model_analysis_fields(ai_response)
+        }, 200
+
+    async def _conversation_context(self, db, session_id: str, doctor):
+        """
+        Cached conversation context, rebuilt from the session's user messages
+        on a miss or when the session has turns it has not seen
+        """
+        stored = (await db.execute(
+            select(func.count(ChatMessage.id)).filter_by(session_id=session_id, message_type='user')
+        )).scalar_one()
+        context = self.chat_contexts.get(session_id, user_message_count=stored)
+        if context is not None:
+            return context
+
+        context = self.chat_contexts.new(session_id)
+        rows = await db.execute(
+            select(ChatMessage.content)
+            .filter_by(session_id=session_id, message_type='user')
+            .order_by(ChatMessage.timestamp)
+        )
+        contents = [content for (content,) in rows]
+
+        def rebuild():
+            for content in contents:
+                context.add_user_message(content, doctor._detect_symptoms(content))
+
+        await self._run(rebuild)
+        return context
+
+    async def get_chat_history(self, request: Request, user: User, session_id: str):
+        async with self.sessions() as db:
+            messages = (await db.execute(
+                select(ChatMessage).filter_by(session_id=session_id).order_by(ChatMessage.timestamp)
+            )).scalars().all()
+        return {
+            'success': True,
+            'messages': [
+                {
+                    'type': msg.message_type,
+                    'content': msg.content,
+                    'timestamp': msg.timestamp.isoformat()
+                }
+                for msg in messages
+            ]
+        }, 200
+
+
+app = AsyncChatApp()
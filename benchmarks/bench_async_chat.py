@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the sync Flask chat views against the ASGI variant (asgi_chat.py)
+
+Starts each server in a subprocess on a scratch SQLite database, then opens
+N concurrent client connections, each sending chat messages as a logged-in
+user. Reports completed and failed requests, p50/p99 latency and
+throughput per concurrency level.
+
+The sync server registers views equivalent to routes.py's start-chat and
+send-message. routes.py itself only runs inside the package app. It is
+served by Werkzeug's threaded server, one thread per connection. The ASGI
+app runs under uvicorn (needs uvicorn, aiosqlite and greenlet).
+--delay-ms adds time to every doctor call to stand in for model inference
+that does not hold the GIL (e.g. in the analysis pool).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+SECRET = 'bench-secret'
+CHAT_MESSAGES = ("I have a fever and headache", "it started two days ago", "can you prescribe something")
+
+
+def slow_down_doctor(delay_ms):
+    from ai_doctor import AIDoctor
+    original = AIDoctor.get_medical_response
+
+    def get_medical_response(self, *args, **kwargs):
+        time.sleep(delay_ms / 1000.0)
+        return original(self, *args, **kwargs)
+
+    AIDoctor.get_medical_response = get_medical_response
+
+
+def serve_sync(db_path, port):
+    import uuid
+    from datetime import datetime
+    from flask import Flask, jsonify, request
+    from flask_login import LoginManager, current_user, login_required
+    from werkzeug.serving import run_simple
+    from ai_doctor import AIDoctor
+    from extensions import db
+    from models import ChatMessage, ChatSession, User
+
+    app = Flask(__name__)
+    app.secret_key = SECRET
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    db.init_app(app)
+    login_manager = LoginManager(app)
+    login_manager.user_loader(lambda user_id: db.session.get(User, int(user_id)))
+    doctor = AIDoctor()
+
+    @app.route('/ai-doctor/start-chat', methods=['POST'])
+    @login_required
+    def start_chat():
+        session_id = str(uuid.uuid4())
+        db.session.add(ChatSession(user_id=current_user.id, session_id=session_id, is_active=True))
+        db.session.add(ChatMessage(session_id=session_id, message_type='ai', content='Hello!'))
+        db.session.commit()
+        return jsonify({'success': True, 'session_id': session_id})
+
+    @app.route('/ai-doctor/send-message', methods=['POST'])
+    @login_required
+    def send_message():
+        data = request.get_json()
+        message, session_id = data['message'], data['session_id']
+        db.session.add(ChatMessage(session_id=session_id, message_type='user', content=message))
+        history = [{'role': 'user', 'message': content} for (content,) in ChatMessage.query.with_entities(
+            ChatMessage.content).filter_by(session_id=session_id, message_type='user').all()]
+        ai_response = doctor.get_medical_response(message, history)
+        db.session.add(ChatMessage(session_id=session_id, message_type='ai', content=ai_response['response']))
+        chat_session = ChatSession.query.filter_by(session_id=session_id).first()
+        chat_session.last_activity = datetime.utcnow()
+        db.session.commit()
+        return jsonify({'success': True, 'ai_response': ai_response['response']})
+
+    run_simple('127.0.0.1', port, app, threaded=True)
+
+
+def serve_async(db_path, port):
+    import uvicorn
+    os.environ.setdefault('ANALYSIS_POOL_WORKERS', '0')
+    from asgi_chat import AsyncChatApp
+    app = AsyncChatApp(f'sqlite:///{db_path}', secret_key=SECRET)
+    uvicorn.run(app, host='127.0.0.1', port=port, log_level='error', backlog=4096)
+
+
+def prepare_database(db_path):
+    """Create the tables and one user; returns that user's session cookie"""
+    from flask import Flask
+    from extensions import db
+    from models import User
+
+    app = Flask(__name__)
+    app.secret_key = SECRET
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.com', first_name='Bench', last_name='User', age=30, gender='other')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    return app.session_interface.get_signing_serializer(app).dumps({'_user_id': str(user_id), '_fresh': True})
+
+
+async def http_post(port, path, payload, cookie, timeout):
+    """One POST on a fresh connection; returns (status, json body)"""
+    body = json.dumps(payload).encode()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: localhost\r\nCookie: session={cookie}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+            + body
+        )
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head, _, content = response.partition(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    return status, json.loads(content) if content else None
+
+
+async def run_load(port, cookie, concurrency, messages_per_client, timeout):
+    latencies = []
+    failures = 0
+
+    async def client():
+        nonlocal failures
+        try:
+            _, started = await http_post(port, '/ai-doctor/start-chat', {}, cookie, timeout)
+            session_id = started['session_id']
+        except Exception:
+            failures += messages_per_client
+            return
+        for text in CHAT_MESSAGES[:messages_per_client]:
+            start = time.perf_counter()
+            try:
+                status, _ = await http_post(port, '/ai-doctor/send-message',
+                                            {'message': text, 'session_id': session_id}, cookie, timeout)
+                if status != 200:
+                    raise RuntimeError(status)
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return latencies, failures, time.perf_counter() - start
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 0.2).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs ASGI chat endpoint benchmark")
+    parser.add_argument('--concurrency', default='10,100,500,1000')
+    parser.add_argument('--messages', type=int, default=3, help='messages per client (max 3)')
+    parser.add_argument('--delay-ms', type=float, default=50.0, help='added time per doctor call')
+    parser.add_argument('--timeout', type=float, default=30.0, help='client timeout per request')
+    parser.add_argument('--serve', choices=['sync', 'async'], help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        slow_down_doctor(args.delay_ms)
+        (serve_sync if args.serve == 'sync' else serve_async)(args.db, args.port)
+        return
+
+    print(f"doctor delay {args.delay_ms}ms, {args.messages} messages per client")
+    print(f"{'server':<7} {'clients':>7} {'ok':>6} {'failed':>7} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+    for mode in ('sync', 'async'):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'chat.db')
+            cookie = prepare_database(db_path)
+            port = free_port()
+            server = subprocess.Popen(
+                [sys.executable, __file__, '--serve', mode, '--db', db_path, '--port', str(port),
+                 '--delay-ms', str(args.delay_ms)],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            try:
+                if not wait_for_port(port):
+                    print(f"{mode:<7} server did not start")
+                    continue
+                for concurrency in (int(level) for level in args.concurrency.split(',')):
+                    latencies, failures, elapsed = asyncio.run(
+                        run_load(port, cookie, concurrency, args.messages, args.timeout)
+                    )
+                    if latencies:
+                        latencies.sort()
+                        p50 = statistics.median(latencies)
+                        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+                    else:
+                        p50 = p99 = float('nan')
+                    print(f"{mode:<7} {concurrency:>7} {len(latencies):>6} {failures:>7} "
+                          f"{p50:>9.1f} {p99:>9.1f} {len(latencies) / elapsed:>8.1f}")
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Load test for dynamic micro-batching of model inference
+
+Drives HuggingFaceModelManager.analyze_symptoms from N concurrent client
+threads and reports p50/p99 latency and throughput, with batching disabled
+(one forward pass per request) and enabled.
+
+With --real the model in --model-path is used (needs transformers and
+torch). Otherwise a simulated model stands in: a forward pass costs a fixed
+overhead plus a smaller per-text cost, and only one pass runs at a time,
+roughly how a CPU-bound classifier behaves on a single process.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'models'))
+
+from batching import BatchingInferenceWorker
+from huggingface_integration import HuggingFaceModelManager
+
+TEXTS = [
+    "I have a fever and headache",
+    "My throat is sore and I'm coughing",
+    "I feel tired and have muscle pain",
+    "Sharp chest pain when I breathe in, and shortness of breath",
+    "Itchy rash on my arms since yesterday",
+    "Nausea and vomiting after eating, with stomach cramps",
+    "Runny nose, sneezing and watery eyes",
+    "Dizzy when standing up, feeling weak",
+]
+
+
+class SimulatedModelManager(HuggingFaceModelManager):
+    """Manager whose forward pass is a timed stand-in for a real model"""
+
+    def __init__(self, pass_ms, per_text_ms, **kwargs):
+        self.pass_ms = pass_ms
+        self.per_text_ms = per_text_ms
+        self._device = threading.Lock()
+        super().__init__(model_path="<simulated>", **kwargs)
+
+    def _load_model(self):
+        self.model = self.tokenizer = object()
+        self._start_batcher()
+        self.model_loaded = True
+        self.load_state = "ready"
+        self._load_done.set()
+
+    def _analyze_batch_with_model(self, texts):
+        with self._device:
+            time.sleep((self.pass_ms + self.per_text_ms * len(texts)) / 1000.0)
+        return [{"model_used": True, "predicted_class": len(text) % 2} for text in texts]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run_load(manager, concurrency, requests):
+    latencies = []
+    lock = threading.Lock()
+
+    def client(i):
+        text = TEXTS[i % len(TEXTS)]
+        start = time.perf_counter()
+        manager.analyze_symptoms(text)
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(client, range(requests)))
+    wall = time.perf_counter() - start
+    return latencies, requests / wall
+
+
+def build_manager(args, max_batch_size):
+    if args.real:
+        return HuggingFaceModelManager(args.model_path, max_batch_size=max_batch_size,
+                                       max_wait_ms=args.max_wait_ms, load="eager")
+    return SimulatedModelManager(args.pass_ms, args.per_text_ms, max_batch_size=max_batch_size,
+                                 max_wait_ms=args.max_wait_ms, load="eager")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching load test")
+    parser.add_argument('--concurrency', default='1,4,16,64', help='comma separated client counts')
+    parser.add_argument('--requests', type=int, default=400, help='requests per run')
+    parser.add_argument('--max-batch-size', type=int, default=16)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0)
+    parser.add_argument('--real', action='store_true', help='use the real model instead of the simulation')
+    parser.add_argument('--model-path', default='models/medical_model')
+    parser.add_argument('--pass-ms', type=float, default=8.0, help='simulated fixed cost per forward pass')
+    parser.add_argument('--per-text-ms', type=float, default=1.0, help='simulated cost per text in a pass')
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    modes = [("unbatched", 1), ("batched", args.max_batch_size)]
+
+    if args.real:
+        print(f"Model: {args.model_path}")
+    else:
+        print(f"Simulated model: {args.pass_ms}ms per pass + {args.per_text_ms}ms per text")
+    print(f"{'mode':<10} {'clients':>7} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9} {'mean batch':>11}")
+
+    for mode, max_batch_size in modes:
+        manager = build_manager(args, max_batch_size)
+        if not manager.model_loaded:
+            print("Model could not be loaded; nothing to measure")
+            return
+        manager.cache = None  # measure inference, not the result cache
+        for concurrency in levels:
+            latencies, throughput = run_load(manager, concurrency, args.requests)
+            mean_batch = "-"
+            if manager.batcher is not None:
+                mean_batch = f"{manager.batcher.get_stats()['mean_batch_size']:.1f}"
+                # Fresh counters for the next concurrency level
+                manager.batcher.close()
+                manager.batcher = BatchingInferenceWorker(
+                    manager._analyze_batch_with_model, max_batch_size, args.max_wait_ms
+                )
+            print(f"{mode:<10} {concurrency:>7} {statistics.median(latencies):>9.1f} "
+                  f"{percentile(latencies, 99):>9.1f} {throughput:>9.1f} {mean_batch:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark of chat turn persistence: commit per turn vs write-behind (chat_writer.py)
+
+Several threads stand in for concurrent send-message requests, each
+persisting chat turns (a user message, an AI reply and the session's
+last_activity) to a scratch SQLite database:
+
+  commit-per-turn   ORM adds and db.session.commit() per turn (previous path)
+  write-behind      ChatWriter.record_turn, flushed once at the end
+  durable           ChatWriter.record_turn(durable=True): every request
+                    waits for its commit, batches still group concurrent turns
+
+Reports sustained messages/second and the number of commits.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask
+from chat_writer import ChatWriter
+from extensions import db
+from models import ChatMessage, ChatSession, User
+
+
+def make_app(db_path, sessions):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.com', first_name='Bench', last_name='User', age=30, gender='other')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.flush()
+        for i in range(sessions):
+            db.session.add(ChatSession(user_id=user.id, session_id=f'session-{i}', is_active=True))
+        db.session.commit()
+    return app
+
+
+def commit_per_turn(app, session_id, turns):
+    with app.app_context():
+        for turn in range(turns):
+            db.session.add(ChatMessage(session_id=session_id, message_type='user', content=f'message {turn}'))
+            db.session.add(ChatMessage(session_id=session_id, message_type='ai', content=f'reply {turn}'))
+            chat_session = ChatSession.query.filter_by(session_id=session_id).first()
+            if chat_session:
+                chat_session.last_activity = datetime.utcnow()
+            db.session.commit()
+
+
+def run(mode, threads, turns, interval_ms):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'chat.db'), threads)
+        writer = ChatWriter(ChatMessage.__table__, ChatSession.__table__, interval_ms=interval_ms)
+        with app.app_context():
+            writer.start(db.engine)
+
+        def client(index):
+            session_id = f'session-{index}'
+            if mode == 'commit-per-turn':
+                commit_per_turn(app, session_id, turns)
+                return
+            for turn in range(turns):
+                writer.record_turn(session_id, f'message {turn}', f'reply {turn}', durable=mode == 'durable')
+
+        workers = [threading.Thread(target=client, args=(i,)) for i in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        writer.flush()
+        elapsed = time.perf_counter() - start
+
+        with app.app_context():
+            stored = ChatMessage.query.count()
+        commits = threads * turns if mode == 'commit-per-turn' else writer.batches
+        return stored / elapsed, stored, commits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Chat write batching benchmark")
+    parser.add_argument('--threads', type=int, default=16, help='concurrent requests')
+    parser.add_argument('--turns', type=int, default=100, help='turns per request thread')
+    parser.add_argument('--interval-ms', type=float, default=20.0)
+    args = parser.parse_args()
+
+    print(f"{args.threads} threads x {args.turns} turns, batch interval {args.interval_ms}ms")
+    print(f"{'mode':<16} {'messages/s':>11} {'stored':>7} {'commits':>8}")
+    for mode in ('commit-per-turn', 'write-behind', 'durable'):
+        rate, stored, commits = run(mode, args.threads, args.turns, args.interval_ms)
+        print(f"{mode:<16} {rate:>11,.0f} {stored:>7} {commits:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark for SymptomAnalyzer condition scoring
+
+Compares the previous per-condition set intersection loop with the
+incidence-matrix scoring at 10, 1k and 10k conditions and checks that
+both pick the same top conditions. Also compares analyze_symptoms called
+per row with the batched analyze_many.
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from knowledge_base import SOURCE_PATH, load_knowledge_base
+from symptom_analyzer import SymptomAnalyzer
+
+VOCABULARY_SIZE = 400
+QUERIES = 200
+
+
+def synthetic_catalogue(size, rng):
+    """Random conditions with 3-8 symptoms each"""
+    vocabulary = [f"symptom_{i}" for i in range(VOCABULARY_SIZE)]
+    return {
+        f"condition_{i}": {
+            'name': f"Condition {i}",
+            'symptoms': rng.sample(vocabulary, rng.randint(3, 8)),
+            'description': 'Synthetic condition',
+            'urgency': 'low',
+            'advice': []
+        }
+        for i in range(size)
+    }, vocabulary
+
+
+def synthetic_analyzer(size, rng, directory):
+    """SymptomAnalyzer over a knowledge base whose conditions are a synthetic catalogue"""
+    conditions, vocabulary = synthetic_catalogue(size, rng)
+    with open(SOURCE_PATH, encoding='utf-8') as f:
+        data = json.load(f)
+    data['conditions'] = conditions
+    source = os.path.join(directory, f'knowledge_base_{size}.json')
+    with open(source, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    knowledge_base = load_knowledge_base(source, os.path.join(directory, f'knowledge_base_{size}.kb'))
+    return SymptomAnalyzer(knowledge_base), vocabulary
+
+
+def legacy_rank(analyzer, symptoms):
+    """Previous implementation: loop over the catalogue building two sets per condition"""
+    condition_scores = {}
+    for condition_id, condition_data in analyzer.conditions_database.items():
+        score = analyzer._calculate_condition_probability(symptoms, condition_data['symptoms'])
+        if score > 0:
+            condition_scores[condition_id] = score
+    return sorted(condition_scores.items(), key=lambda x: x[1], reverse=True)[:3]
+
+
+def main():
+    rng = random.Random(3)
+    tmp = tempfile.TemporaryDirectory()
+    print("📊 Condition scoring benchmark (microseconds per query)")
+    print("=" * 60)
+    print(f"{'conditions':>10} {'loop':>12} {'matrix':>12} {'speedup':>10}")
+
+    for size in (10, 1000, 10000):
+        analyzer, vocabulary = synthetic_analyzer(size, rng, tmp.name)
+        queries = [rng.sample(vocabulary, rng.randint(1, 6)) for _ in range(QUERIES)]
+
+        for symptoms in queries:
+            assert legacy_rank(analyzer, symptoms) == analyzer._rank_conditions(symptoms), symptoms
+
+        start = time.perf_counter()
+        for symptoms in queries:
+            legacy_rank(analyzer, symptoms)
+        loop = (time.perf_counter() - start) / QUERIES * 1e6
+
+        start = time.perf_counter()
+        for symptoms in queries:
+            analyzer._rank_conditions(symptoms)
+        matrix = (time.perf_counter() - start) / QUERIES * 1e6
+
+        print(f"{size:>10} {loop:>12.1f} {matrix:>12.1f} {loop / matrix:>9.1f}x")
+
+    # Batch API: one matrix product per chunk of rows, fed from a generator
+    analyzer, vocabulary = synthetic_analyzer(1000, rng, tmp.name)
+    rows = [rng.sample(vocabulary, rng.randint(1, 6)) for _ in range(5000)]
+
+    start = time.perf_counter()
+    single = [analyzer.analyze_symptoms(symptoms, 40, 'other', 'mild') for symptoms in rows]
+    per_call = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batched = list(analyzer.analyze_many((symptoms for symptoms in rows), 40, 'other', 'mild'))
+    batch = time.perf_counter() - start
+
+    assert single == batched
+    print(f"\n📦 analyze_many, {len(rows)} rows x 1000 conditions")
+    print(f"per-call: {len(rows) / per_call:,.0f} rows/sec   batched: {len(rows) / batch:,.0f} rows/sec")
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark of PaymentService.calculate_consultation_cost: rebuilt per call vs
+the cached entitlement snapshot (payment_service.EntitlementCache)
+
+A mix of users (free quota left, subscribed, payment required) is looked up
+repeatedly, as the dashboard, /ai-doctor and start-chat do on every request.
+Also checks that both paths agree.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask
+from extensions import db
+from models import User
+from payment_service import PaymentService
+
+
+def previous_cost(user):
+    """calculate_consultation_cost before the snapshot cache"""
+    if user.can_use_free_consultation():
+        return {'cost': 0.0, 'currency': 'USD', 'payment_required': False,
+                'message': 'Free consultation available'}
+    elif user.has_active_subscription():
+        return {'cost': 0.0, 'currency': 'USD', 'payment_required': False,
+                'message': 'Covered by active subscription'}
+    return {'cost': 9.99, 'currency': 'USD', 'payment_required': True,
+            'message': 'Payment required for consultation'}
+
+
+def make_users(app, count):
+    """Users loaded from the database, as current_user is on each request"""
+    with app.app_context():
+        db.create_all()
+        for i in range(count):
+            user = User(id=i + 1, email=f'user{i}@example.com', free_consultations_used=int(i % 3 != 0),
+                        subscription_status='premium' if i % 3 == 1 else 'free')
+            if i % 3 == 1:
+                user.subscription_expires = datetime.utcnow() + timedelta(days=30)
+            db.session.add(user)
+        db.session.commit()
+        db.session.expunge_all()
+        return User.query.order_by(User.id).all()
+
+
+def timed(func, users, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for user in users:
+            func(user)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entitlement snapshot benchmark")
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp.name, 'bench.db')}"
+    db.init_app(app)
+    users = make_users(app, args.users)
+    service = PaymentService()
+
+    mismatches = 0
+    for user in users:
+        snapshot = service.calculate_consultation_cost(user)
+        expected = previous_cost(user)
+        mismatches += any(snapshot[key] != value for key, value in expected.items())
+
+    lookups = args.users * args.rounds
+    before = timed(previous_cost, users, args.rounds)
+    after = timed(service.calculate_consultation_cost, users, args.rounds)
+    print(f"{args.users} users x {args.rounds} rounds, {mismatches} mismatches")
+    print(f"{'rebuilt per call':<18} {lookups / before:>12,.0f} lookups/s")
+    print(f"{'cached snapshot':<18} {lookups / after:>12,.0f} lookups/s  ({before / after:.2f}x)")
+    print(f"cache: {service.entitlements.get_stats()}")
+    tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main()
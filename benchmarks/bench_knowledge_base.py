@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the compiled knowledge base snapshot (knowledge_base.py)
+
+Compares parsing data/knowledge_base.json with mapping its compiled
+snapshot, then the cost of constructing the engines (ai_doctor.AIDoctor,
+SymptomAnalyzer) when every instance builds its own indexes, as before,
+against instances that share the ones derived from the loaded snapshot.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import knowledge_base
+from ai_doctor import AIDoctor
+from symptom_analyzer import SymptomAnalyzer
+
+
+def per_second(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return rounds / (time.perf_counter() - start)
+
+
+def main():
+    rounds = 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path = os.path.join(tmp, 'knowledge_base.kb')
+        knowledge_base.compile_snapshot(knowledge_base.SOURCE_PATH, snapshot_path)
+        print(f"source {os.path.getsize(knowledge_base.SOURCE_PATH)} bytes, "
+              f"snapshot {os.path.getsize(snapshot_path)} bytes")
+
+        def parse_json():
+            with open(knowledge_base.SOURCE_PATH, encoding='utf-8') as f:
+                json.load(f)
+
+        print("\n⚡ Loads/sec")
+        print(f"{'parse JSON source':<34} {per_second(parse_json, rounds):>10,.0f}")
+        print(f"{'map compiled snapshot':<34} "
+              f"{per_second(lambda: knowledge_base.open_snapshot(snapshot_path), rounds):>10,.0f}")
+
+        shared = knowledge_base.open_snapshot(snapshot_path)
+        print("\n⚡ Engine constructions/sec")
+        for name, engine in (("AIDoctor", AIDoctor), ("SymptomAnalyzer", SymptomAnalyzer)):
+            # A fresh snapshot per instance rebuilds every derived index, as
+            # constructing from the dict literals used to
+            rebuilt = per_second(lambda: engine(knowledge_base.open_snapshot(snapshot_path)), rounds // 10)
+            reused = per_second(lambda: engine(shared), rounds)
+            print(f"{name + ' (own indexes)':<34} {rebuilt:>10,.0f}")
+            print(f"{name + ' (shared snapshot)':<34} {reused:>10,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Benchmark for length-bucketed padding in HuggingFaceModelManager
+
+Feeds batches of chat-like messages (mostly short, a long tail of long
+ones) through _analyze_batch_with_model and compares:
+
+  pad-longest/512  every batch padded to its longest text (previous behaviour)
+  buckets/512      texts grouped by length bucket, padded to the bucket boundary
+  buckets/128      same, with the shorter chat max length
+
+With --real the downloaded model is used. Otherwise a small NumPy
+transformer stand-in (attention plus a projection, cost growing with
+batch x sequence length) and a word-level tokenizer are used.
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'models'))
+
+from huggingface_integration import HuggingFaceModelManager
+
+WORDS = (
+    "i have had a fever headache cough sore throat since yesterday and my chest hurts when "
+    "i breathe also feeling tired dizzy nauseous with stomach pain the pain is sharp worse "
+    "at night back neck muscle ache runny nose sneezing rash itchy skin swelling ankle knee "
+    "after eating sometimes vomiting no appetite trouble sleeping for three days now"
+).split()
+
+
+def make_messages(count, seed=7):
+    """Chat-like length distribution: median ~15 words, long tail to a few hundred"""
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        words = min(400, max(1, int(rng.lognormvariate(2.7, 0.9))))
+        messages.append(" ".join(rng.choice(WORDS) for _ in range(words)))
+    return messages
+
+
+class WordTokenizer:
+    """Word-level stand-in for a Hugging Face tokenizer ([CLS] ... [SEP])"""
+
+    def __call__(self, texts, truncation=True, max_length=512):
+        input_ids = []
+        for text in texts:
+            ids = [1000 + hash(word) % 20000 for word in re.findall(r"\w+|[^\w\s]", text.lower())]
+            input_ids.append([101] + ids[:max_length - 2] + [102])
+        return {"input_ids": input_ids, "attention_mask": [[1] * len(ids) for ids in input_ids]}
+
+    def pad(self, features, padding="longest", max_length=None, return_tensors="np"):
+        longest = max(len(feature["input_ids"]) for feature in features)
+        target = max_length if padding == "max_length" else longest
+        padded = {}
+        for key in features[0]:
+            rows = [feature[key] + [0] * (target - len(feature[key])) for feature in features]
+            padded[key] = np.array(rows, dtype=np.int64)
+        return padded
+
+
+class SimulatedManager(HuggingFaceModelManager):
+    """Manager running a two-layer NumPy attention stack instead of a real model"""
+
+    HIDDEN = 256
+
+    def __init__(self, **kwargs):
+        rng = np.random.default_rng(0)
+        self.embeddings = rng.standard_normal((22000, self.HIDDEN), dtype=np.float32) * 0.05
+        self.weights = [rng.standard_normal((self.HIDDEN, self.HIDDEN), dtype=np.float32) * 0.05 for _ in range(2)]
+        self.classifier = rng.standard_normal((self.HIDDEN, 5), dtype=np.float32)
+        super().__init__(model_path="<simulated>", backend="onnx", load="eager", max_batch_size=1, **kwargs)
+
+    def _load_model(self):
+        self.tokenizer = WordTokenizer()
+        self.model = object()
+        self.model_loaded = True
+        self.load_state = "ready"
+        self._load_done.set()
+
+    def _predict(self, inputs):
+        x = self.embeddings[inputs["input_ids"]]
+        mask = inputs["attention_mask"][:, None, :].astype(np.float32)
+        for weight in self.weights:
+            scores = (x @ x.transpose(0, 2, 1)) * mask
+            x = np.tanh((scores @ x) / x.shape[1] @ weight)
+        logits = x[:, 0, :] @ self.classifier
+        logits -= logits.max(axis=-1, keepdims=True)
+        exp = np.exp(logits)
+        return (exp / exp.sum(axis=-1, keepdims=True)).tolist()
+
+
+def padded_tokens(manager, batch):
+    return sum(inputs["input_ids"].shape[0] * inputs["input_ids"].shape[1]
+               for _, inputs in manager._bucketed_inputs(batch))
+
+
+def measure(manager, batches, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for batch in batches:
+            manager._analyze_batch_with_model(batch)
+    elapsed = time.perf_counter() - start
+    texts = sum(len(batch) for batch in batches) * repeats
+    return texts / elapsed, sum(padded_tokens(manager, batch) for batch in batches)
+
+
+def build(args, **kwargs):
+    if args.real:
+        return HuggingFaceModelManager(args.model_path, max_batch_size=1, load="eager", **kwargs)
+    return SimulatedManager(**kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Length bucketing benchmark")
+    parser.add_argument('--messages', type=int, default=512)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--real', action='store_true', help='use the downloaded model')
+    parser.add_argument('--model-path', default='models/medical_text_classifier')
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages)
+    batches = [messages[i:i + args.batch_size] for i in range(0, len(messages), args.batch_size)]
+
+    configs = [
+        ("pad-longest/512", dict(max_length=512, length_buckets=())),
+        ("buckets/512", dict(max_length=512)),
+        ("buckets/128", dict(max_length=128)),
+    ]
+
+    word_counts = sorted(len(message.split()) for message in messages)
+    print(f"{len(messages)} messages, batch size {args.batch_size}; words p50={word_counts[len(word_counts) // 2]} "
+          f"p90={word_counts[int(len(word_counts) * 0.9)]} max={word_counts[-1]}")
+    print(f"{'config':<16} {'texts/s':>9} {'padded tokens':>14} {'speedup':>8}")
+
+    baseline = None
+    for name, kwargs in configs:
+        manager = build(args, **kwargs)
+        if not manager.model_loaded:
+            print("Model could not be loaded; nothing to measure")
+            return
+        manager._analyze_batch_with_model(batches[0])  # warm-up
+        throughput, tokens = measure(manager, batches, args.repeats)
+        baseline = baseline or throughput
+        print(f"{name:<16} {throughput:>9.1f} {tokens:>14} {throughput / baseline:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
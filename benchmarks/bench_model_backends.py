@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the HuggingFaceModelManager inference backends
+
+Each backend (torch, torch-int8, onnx, onnx-int8) is loaded in its own
+process so resident memory is measured in isolation. Reports load time,
+p50/p99 single-text latency, RSS after loading and running (plus the growth
+caused by loading, libraries included), and how often the predicted class
+agrees with the fp32 PyTorch model.
+
+Needs a downloaded model (models/download_model.py) and, for the ONNX
+backends, the files written by models/export_model.py.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+sys.path.insert(0, MODELS_DIR)
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'symptom_corpus.json')
+BACKENDS = ["torch", "torch-int8", "onnx", "onnx-int8"]
+
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def load_texts():
+    with open(CORPUS_PATH) as f:
+        return [case['message'] for case in json.load(f)]
+
+
+def run_child(backend, model_path, rounds):
+    """Measure one backend; prints a JSON line for the parent"""
+    from huggingface_integration import HuggingFaceModelManager
+
+    texts = load_texts()
+    baseline_rss = rss_mb()
+    manager = HuggingFaceModelManager(model_path, max_batch_size=1, load="eager", backend=backend)
+    if not manager.model_loaded:
+        print(json.dumps({"backend": backend, "error": manager.load_error or f"model {manager.load_state}"}))
+        return
+    manager.cache = None  # every round runs the model
+
+    manager.analyze_symptoms(texts[0])  # warm-up
+    latencies = []
+    predictions = []
+    for round_index in range(rounds):
+        for text in texts:
+            start = time.perf_counter()
+            result = manager.analyze_symptoms(text)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if round_index == 0:
+                predictions.append(result["predicted_class"])
+
+    latencies.sort()
+    print(json.dumps({
+        "backend": backend,
+        "load_s": manager.load_time,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "rss_mb": rss_mb(),
+        "model_rss_mb": rss_mb() - baseline_rss,
+        "predictions": predictions,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare model inference backends")
+    parser.add_argument('--model-path', default=os.path.join(MODELS_DIR, 'models', 'medical_text_classifier'))
+    parser.add_argument('--backends', default=','.join(BACKENDS))
+    parser.add_argument('--rounds', type=int, default=5, help='passes over the corpus per backend')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.model_path, args.rounds)
+        return
+
+    results = {}
+    for backend in args.backends.split(','):
+        child = subprocess.run(
+            [sys.executable, __file__, '--child', backend, '--model-path', args.model_path,
+             '--rounds', str(args.rounds)],
+            capture_output=True, text=True
+        )
+        output = child.stdout.strip().splitlines()
+        if output:
+            results[backend] = json.loads(output[-1])
+        else:
+            errors = child.stderr.strip().splitlines()
+            results[backend] = {"error": errors[-1] if errors else f"exit code {child.returncode}"}
+
+    reference = results.get("torch", {}).get("predictions")
+    print(f"{'backend':<11} {'load s':>7} {'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>8} {'model MB':>9} {'agreement':>10}")
+    for backend, result in results.items():
+        if "error" in result:
+            print(f"{backend:<11} unavailable: {result['error']}")
+            continue
+        agreement = "-"
+        if reference:
+            same = sum(a == b for a, b in zip(reference, result["predictions"]))
+            agreement = f"{same / len(reference):.1%}"
+        print(f"{backend:<11} {result['load_s']:>7.2f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+              f"{result['rss_mb']:>8.0f} {result['model_rss_mb']:>9.0f} {agreement:>10}")
+
+
+if __name__ == '__main__':
+    main()
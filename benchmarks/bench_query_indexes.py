@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the hot-path indexes on Consultation and ChatMessage
+
+Loads a scratch SQLite database (1M consultations and 10M chat messages by
+default) and times the dashboard query and the get_chat_history query
+before and after creating the composite indexes from models.py.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sqlalchemy import create_engine, select
+from models import ChatMessage, ChatSession, Consultation, User
+
+CHUNK = 50_000
+
+
+def load(engine, table, total, make_row):
+    with engine.begin() as conn:
+        for start in range(0, total, CHUNK):
+            conn.execute(table.insert(), [make_row(i) for i in range(start, min(start + CHUNK, total))])
+
+
+def time_queries(engine, statements):
+    samples = []
+    with engine.connect() as conn:
+        for statement in statements:
+            start = time.perf_counter()
+            conn.execute(statement).all()
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--consultations', type=int, default=1_000_000)
+    parser.add_argument('--sessions', type=int, default=200_000)
+    parser.add_argument('--messages', type=int, default=10_000_000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    epoch = datetime(2024, 1, 1)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        tables = [User.__table__, Consultation.__table__, ChatSession.__table__, ChatMessage.__table__]
+        User.metadata.create_all(engine, tables=tables)
+        hot_indexes = list(Consultation.__table__.indexes) + list(ChatMessage.__table__.indexes)
+        for index in hot_indexes:
+            index.drop(bind=engine)
+
+        print(f"📥 Loading {args.consultations:,} consultations and {args.messages:,} messages...")
+        started = time.perf_counter()
+        load(engine, Consultation.__table__, args.consultations, lambda i: {
+            'user_id': rng.randint(1, args.users),
+            'symptoms': 'fever, cough',
+            'severity': 'mild',
+            'analysis': '{"conditions": []}',
+            'created_at': epoch + timedelta(seconds=i),
+            'payment_status': 'free'
+        })
+        load(engine, ChatMessage.__table__, args.messages, lambda i: {
+            'session_id': f"session-{rng.randint(1, args.sessions)}",
+            'message_type': 'user' if i % 2 else 'ai',
+            'content': 'I have a fever and headache',
+            'timestamp': epoch + timedelta(milliseconds=i)
+        })
+        print(f"   loaded in {time.perf_counter() - started:.0f}s")
+
+        users = [rng.randint(1, args.users) for _ in range(args.queries)]
+        sessions = [f"session-{rng.randint(1, args.sessions)}" for _ in range(args.queries)]
+        dashboard = [
+            select(Consultation.__table__).where(Consultation.user_id == user_id).order_by(Consultation.created_at.desc())
+            for user_id in users
+        ]
+        history = [
+            select(ChatMessage.__table__).where(ChatMessage.session_id == session_id).order_by(ChatMessage.timestamp)
+            for session_id in sessions
+        ]
+
+        results = {}
+        results['no index'] = (time_queries(engine, dashboard), time_queries(engine, history))
+        for index in hot_indexes:
+            index.create(bind=engine)
+        results['indexed'] = (time_queries(engine, dashboard), time_queries(engine, history))
+
+        print("\n⏱️  Latency in ms (p50 / p99)")
+        print(f"{'':>10} {'dashboard':>22} {'get_chat_history':>22}")
+        for label, ((d50, d99), (h50, h99)) in results.items():
+            print(f"{label:>10} {d50:>10.2f} / {d99:>9.2f} {h50:>10.2f} / {h99:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
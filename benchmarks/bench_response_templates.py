@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Parity check and throughput benchmark for the precompiled response templates
+(response_templates.py)
+
+Compares the previous per-call f-string assembly of app.AIDoctor.get_response
+and ai_doctor.AIDoctor._provide_symptom_analysis / _provide_prescription
+with the template lookups. First every symptom combination (up to three
+symptoms) and every corpus message is rendered both ways, and any difference
+is reported. Then replies/second are measured for each.
+"""
+
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from itertools import permutations
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from ai_doctor import AIDoctor
+from app import AIDoctor as DiagnosisDoctor
+
+CORPUS_FILE = os.path.join(os.path.dirname(__file__), 'symptom_corpus.json')
+
+
+def legacy_symptom_analysis(doctor, symptoms):
+    """Previous ai_doctor.AIDoctor._provide_symptom_analysis"""
+    conditions = []
+    medications = []
+    advice = []
+
+    for symptom in symptoms:
+        if symptom in doctor.medical_knowledge:
+            info = doctor.medical_knowledge[symptom]
+            conditions.extend(info['conditions'][:2])
+            medications.extend(info['medications'][:2])
+            advice.append(info['advice'])
+
+    if "chest pain" in symptoms and "difficulty breathing" in symptoms:
+        response = "Based on your symptoms of chest pain and difficulty breathing, especially with your history of asthma, this could be costochondritis (inflammation of rib cartilage) or an asthma exacerbation. As your doctor, I recommend: 1) Use your asthma inhaler if prescribed, 2) Take ibuprofen 400mg every 6-8 hours for pain, 3) Avoid sleeping on your left side, 4) Apply heat to the painful area. Monitor your breathing - if it worsens, contact me immediately."
+        medications = ["Ibuprofen 400mg", "Asthma inhaler (if prescribed)", "Heat therapy"]
+        advice = ["Use asthma inhaler", "Avoid left side sleeping", "Apply heat therapy", "Monitor breathing"]
+    else:
+        response = f"Based on your symptoms, you appear to have {', '.join(conditions[:2])}. As your doctor, I recommend {advice[0] if advice else 'rest and monitoring'}. You can take {', '.join(medications[:2])} to help manage your symptoms. Let me know if your symptoms worsen or persist beyond a few days."
+
+    return {
+        "response": response,
+        "medications": medications[:3],
+        "advice": advice[:2],
+        "timestamp": datetime.utcnow().isoformat(),
+        "requires_follow_up": True
+    }
+
+
+def legacy_prescription(doctor, symptoms):
+    """Previous ai_doctor.AIDoctor._provide_prescription"""
+    conditions = []
+    medications = []
+    advice = []
+
+    for symptom in symptoms:
+        if symptom in doctor.medical_knowledge:
+            info = doctor.medical_knowledge[symptom]
+            conditions.extend(info['conditions'][:2])
+            medications.extend(info['medications'][:2])
+            advice.append(info['advice'])
+
+    if not conditions:
+        conditions = ["General health concern"]
+        advice = ["Rest and monitor symptoms"]
+
+    return {
+        "response": f"Based on your symptoms, here's your prescription: {', '.join(medications[:3])}. Take as directed for {', '.join(conditions[:2])}. {advice[0] if advice else 'Rest and monitor your symptoms'}. Follow up with me if symptoms persist or worsen.",
+        "medications": medications[:3],
+        "advice": advice[:2],
+        "timestamp": datetime.utcnow().isoformat(),
+        "requires_follow_up": False
+    }
+
+
+def legacy_diagnosis_reply(doctor, user_message):
+    """Previous diagnosis branches of app.AIDoctor.get_response"""
+    user_message = user_message.lower().strip()
+    matched_symptoms = []
+    for rank, symptom_key in sorted(doctor.symptom_matcher.find(user_message)):
+        if symptom_key not in matched_symptoms:
+            matched_symptoms.append(symptom_key)
+    if matched_symptoms:
+        most_severe = max(matched_symptoms, key=lambda x: doctor.symptom_database[x]['severity'])
+        info = doctor.symptom_database[most_severe]
+        diagnosis = {'disease': info['diseases'][0], 'prescription': info['prescription'],
+                     'severity': info['severity'], 'matched_symptoms': matched_symptoms}
+        symptoms_list = ', '.join(diagnosis['matched_symptoms']).replace('_', ' ')
+        return f"I understand you're experiencing {symptoms_list}. Based on your symptoms, you may be experiencing **{diagnosis['disease']}**.\n\n**My Prescription:**\n{diagnosis['prescription']}\n\nWould you like me to explain the dosage or any side effects?\n\n**Important:** This is for informational purposes only and should not replace professional medical advice. If symptoms persist or worsen, please consult with a healthcare provider."
+    diagnosis = {'disease': 'General Consultation Needed',
+                 'prescription': 'Please provide more specific symptoms or consult a healthcare provider.'}
+    return f"I can see you're not feeling well. Based on what you've described, you may be experiencing **{diagnosis['disease']}**.\n\n**My Prescription:**\n{diagnosis['prescription']}\n\nWould you like me to explain the dosage or any side effects?\n\n**Important:** This is for informational purposes only and should not replace professional medical advice. If symptoms persist or worsen, please consult with a healthcare provider."
+
+
+def diagnosis_reply(doctor, user_message):
+    matched_symptoms = doctor._match_symptoms(user_message.lower().strip())
+    if matched_symptoms:
+        return doctor.templates.render(matched_symptoms)[1]
+    return doctor.templates.general()[1]
+
+
+def without_timestamp(reply):
+    return {key: value for key, value in reply.items() if key != 'timestamp'}
+
+
+def stamped(reply):
+    """Add the timestamp get_medical_response now adds once per reply"""
+    reply["timestamp"] = datetime.utcnow().isoformat()
+    return reply
+
+
+def replies_per_second(func, inputs, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for item in inputs:
+            func(item)
+    return rounds * len(inputs) / (time.perf_counter() - start)
+
+
+def main():
+    doctor = AIDoctor()
+    diagnosis_doctor = DiagnosisDoctor()
+    with open(CORPUS_FILE) as f:
+        corpus = [case['message'] for case in json.load(f)]
+
+    known = list(doctor.medical_knowledge)
+    symptom_lists = [[]] + [list(combo) for size in (1, 2, 3) for combo in permutations(known, size)]
+    symptom_lists += [doctor._detect_symptoms(message) for message in corpus]
+
+    print("🧪 Response template parity")
+    print("=" * 60)
+    mismatches = 0
+    for symptoms in symptom_lists:
+        for name, legacy, current in (
+            ("analysis", legacy_symptom_analysis(doctor, symptoms), doctor._provide_symptom_analysis(symptoms, "")),
+            ("prescription", legacy_prescription(doctor, symptoms), doctor._provide_prescription(symptoms)),
+        ):
+            if without_timestamp(legacy) != current:
+                mismatches += 1
+                print(f"  ❌ {name} differs for {symptoms}")
+    diagnosis_messages = corpus + [f"i have {a} and {b}".replace('_', ' ')
+                                   for a, b in permutations(diagnosis_doctor.symptom_database, 2)]
+    for message in diagnosis_messages:
+        if legacy_diagnosis_reply(diagnosis_doctor, message) != diagnosis_reply(diagnosis_doctor, message):
+            mismatches += 1
+            print(f"  ❌ diagnosis reply differs for {message!r}")
+    print(f"{len(symptom_lists) * 2 + len(diagnosis_messages)} replies compared, {mismatches} mismatches")
+
+    corpus_symptoms = [symptoms for symptoms in symptom_lists[-len(corpus):] if symptoms]
+    print("\n⚡ Throughput (replies/sec)")
+    print(f"{'reply':<22} {'f-strings':>12} {'templates':>12} {'speedup':>8}")
+    for name, legacy, current, inputs in (
+        ("symptom analysis", lambda s: legacy_symptom_analysis(doctor, s),
+         lambda s: stamped(doctor._provide_symptom_analysis(s, "")), corpus_symptoms),
+        ("prescription", lambda s: legacy_prescription(doctor, s),
+         lambda s: stamped(doctor._provide_prescription(s)), corpus_symptoms),
+        ("get_response diagnosis", lambda m: legacy_diagnosis_reply(diagnosis_doctor, m),
+         lambda m: diagnosis_reply(diagnosis_doctor, m), corpus),
+    ):
+        legacy_rate = replies_per_second(legacy, inputs, 2000)
+        current_rate = replies_per_second(current, inputs, 2000)
+        print(f"{name:<22} {legacy_rate:>12,.0f} {current_rate:>12,.0f} {current_rate / legacy_rate:>7.2f}x")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
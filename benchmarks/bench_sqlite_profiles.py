@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark of concurrent reads and writes under each database profile (db_profiles.py)
+
+Reader threads page through chat history (the AI Doctor history query)
+while writer threads each commit chat messages, all against one scratch
+SQLite database, for a fixed duration:
+
+  default      rollback journal, SQLAlchemy's default pool and pragmas
+  sqlite-prod  WAL, synchronous=NORMAL, busy_timeout, larger cache, mmap,
+               thread-safe QueuePool
+
+Reports reads/s, writes/s, p99 read latency and failed operations
+("database is locked").
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask
+from sqlalchemy.exc import OperationalError
+from db_profiles import PROFILES, init_db
+from extensions import db
+from models import ChatMessage, ChatSession, User
+
+
+def make_app(db_path, profile, sessions, seed_messages):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    init_db(app, db, profile)
+    with app.app_context():
+        db.create_all()
+        user = User(email='bench@example.com', first_name='Bench', last_name='User', age=30, gender='other')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.flush()
+        for i in range(sessions):
+            session_id = f'session-{i}'
+            db.session.add(ChatSession(user_id=user.id, session_id=session_id, is_active=True))
+            for n in range(seed_messages):
+                db.session.add(ChatMessage(session_id=session_id, message_type='user', content=f'seed {n}'))
+        db.session.commit()
+    return app
+
+
+def run(profile, readers, writers, sessions, duration):
+    with tempfile.TemporaryDirectory() as tmp:
+        app = make_app(os.path.join(tmp, 'bench.db'), profile, sessions, seed_messages=50)
+        stop = threading.Event()
+        reads, writes, errors, latencies = [0], [0], [0], []
+        lock = threading.Lock()
+
+        def reader(index):
+            done, failed, lat = 0, 0, []
+            with app.app_context():
+                while not stop.is_set():
+                    session_id = f'session-{(index + done) % sessions}'
+                    start = time.perf_counter()
+                    try:
+                        ChatMessage.query.filter_by(session_id=session_id) \
+                            .order_by(ChatMessage.timestamp.desc()).limit(20).all()
+                        done += 1
+                        lat.append(time.perf_counter() - start)
+                    except OperationalError:
+                        failed += 1
+                    db.session.rollback()
+            with lock:
+                reads[0] += done
+                errors[0] += failed
+                latencies.extend(lat)
+
+        def writer(index):
+            done, failed = 0, 0
+            with app.app_context():
+                while not stop.is_set():
+                    try:
+                        db.session.add(ChatMessage(session_id=f'session-{index % sessions}',
+                                                   message_type='user', content=f'message {done}'))
+                        db.session.commit()
+                        done += 1
+                    except OperationalError:
+                        db.session.rollback()
+                        failed += 1
+            with lock:
+                writes[0] += done
+                errors[0] += failed
+
+        threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+        threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+        for thread in threads:
+            thread.start()
+        time.sleep(duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        with app.app_context():
+            db.engine.dispose()
+
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else float('nan')
+        return reads[0] / duration, writes[0] / duration, p99, errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite profile concurrency benchmark")
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--sessions', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds per profile')
+    args = parser.parse_args()
+
+    print(f"{args.readers} readers + {args.writers} writers, {args.duration:g}s per profile")
+    print(f"{'profile':<12} {'reads/s':>9} {'writes/s':>9} {'p99 read ms':>12} {'errors':>7}")
+    for profile in PROFILES:
+        read_rate, write_rate, p99, errors = run(profile, args.readers, args.writers, args.sessions, args.duration)
+        print(f"{profile:<12} {read_rate:>9,.0f} {write_rate:>9,.0f} {p99:>12.2f} {errors:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Regression corpus and throughput benchmark for ai_doctor.AIDoctor._detect_symptoms
+
+Runs every message in symptom_corpus.json through the previous substring
+detector and the token index, fails if the token index gets a message
+wrong that the previous detector got right, and reports messages/second.
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from ai_doctor import AIDoctor
+
+CORPUS_FILE = os.path.join(os.path.dirname(__file__), 'symptom_corpus.json')
+
+
+def legacy_detect(doctor, user_message):
+    """Previous implementation: str.replace normalisation plus substring scans"""
+    text = user_message.lower().strip()
+    text = text.replace("i have", "").replace("i'm experiencing", "").replace("i feel", "")
+    text = text.replace("am", "").replace("is", "").replace("are", "")
+
+    detected_symptoms = []
+    for symptom in doctor.medical_knowledge.keys():
+        if symptom in text:
+            detected_symptoms.append(symptom)
+    for base_symptom, variations in doctor.symptom_variations.items():
+        if any(variation in text for variation in variations) and base_symptom not in detected_symptoms:
+            detected_symptoms.append(base_symptom)
+    for base_symptom, cues in doctor.symptom_cues.items():
+        if any(cue in text for cue in cues) and base_symptom not in detected_symptoms:
+            detected_symptoms.append(base_symptom)
+    return detected_symptoms
+
+
+def messages_per_second(func, messages, rounds=200):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            func(message)
+    return rounds * len(messages) / (time.perf_counter() - start)
+
+
+def main():
+    doctor = AIDoctor()
+    with open(CORPUS_FILE) as f:
+        corpus = json.load(f)
+
+    print("🧪 Symptom detection regression corpus")
+    print("=" * 60)
+    legacy_correct = 0
+    index_correct = 0
+    regressions = []
+    for case in corpus:
+        expected = set(case['expected'])
+        legacy = set(legacy_detect(doctor, case['message']))
+        detected = set(doctor._detect_symptoms(case['message']))
+        legacy_correct += legacy == expected
+        index_correct += detected == expected
+        if legacy == expected and detected != expected:
+            regressions.append((case['message'], sorted(expected), sorted(detected)))
+        elif legacy != expected and detected == expected:
+            print(f"  ✅ fixed: {case['message']!r} (was {sorted(legacy)})")
+
+    print(f"Legacy detector: {legacy_correct}/{len(corpus)} correct")
+    print(f"Token index:     {index_correct}/{len(corpus)} correct")
+    for message, expected, detected in regressions:
+        print(f"  ❌ regression: {message!r} expected {expected}, got {detected}")
+
+    messages = [case['message'] for case in corpus]
+    legacy_rate = messages_per_second(lambda m: legacy_detect(doctor, m), messages)
+    index_rate = messages_per_second(doctor._detect_symptoms, messages)
+    print("\n⚡ Throughput")
+    print(f"Legacy detector: {legacy_rate:,.0f} messages/sec")
+    print(f"Token index:     {index_rate:,.0f} messages/sec")
+
+    # Knowledge-base size should not affect the token index
+    for extra in (1000, 10000):
+        big = AIDoctor()
+        for i in range(extra):
+            big.symptom_variations.setdefault("pain", []).append(f"synthetic term {i}")
+        big.symptom_index = big._build_symptom_index()
+        legacy_rate = messages_per_second(lambda m: legacy_detect(big, m), messages, rounds=5)
+        index_rate = messages_per_second(big._detect_symptoms, messages)
+        print(f"+{extra:>5} terms: legacy {legacy_rate:>10,.0f}/sec   token index {index_rate:>10,.0f}/sec")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for app.AIDoctor.analyze_symptoms symptom matching
+
+Compares the compiled phrase matcher against the previous per-call
+substring scan as the symptom vocabulary grows, and checks that both
+return the same matched-symptom list.
+"""
+
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import AIDoctor
+
+MESSAGES = [
+    "I have a fever and headache",
+    "My throat is sore and I'm coughing a lot",
+    "I feel tired and have muscle pain all over",
+    "Sharp chest pain near my ribs when I breathe",
+    "Stomach upset with loose stools since yesterday",
+    "Feeling dizzy and lightheaded, also some nausea",
+    "Lower back ache after lifting boxes",
+    "Runny nose, stuffy nose and a bit of temperature",
+    "hello doctor, how are you today?",
+    "My tummy pain is getting worse and I feel queasy",
+]
+
+
+def legacy_match(doctor, symptoms_text):
+    """Previous implementation: substring scan over every key and variation"""
+    symptoms_text = symptoms_text.lower()
+    matched_symptoms = []
+    for symptom_key in doctor.symptom_database:
+        if symptom_key in symptoms_text:
+            matched_symptoms.append(symptom_key)
+    for symptom_key, variations in doctor.symptom_variations.items():
+        if any(var in symptoms_text for var in variations):
+            if symptom_key not in matched_symptoms:
+                matched_symptoms.append(symptom_key)
+    return matched_symptoms
+
+
+def grow_vocabulary(doctor, extra_terms, seed=7):
+    """Add synthetic symptoms with a few variations each"""
+    rng = random.Random(seed)
+    base = dict(doctor.symptom_database['headache'])
+    for i in range(extra_terms // 4):
+        key = f"synthetic_{i}"
+        doctor.symptom_database[key] = base
+        doctor.symptom_variations[key] = [
+            ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(6, 12)))
+            for _ in range(3)
+        ]
+    doctor.symptom_matcher = doctor._build_symptom_matcher()
+
+
+def time_per_message(func, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for message in MESSAGES:
+            func(message)
+    return (time.perf_counter() - start) / (rounds * len(MESSAGES)) * 1e6
+
+
+def main():
+    print("🔬 Symptom matcher benchmark (microseconds per message)")
+    print("=" * 60)
+    print(f"{'terms':>8} {'legacy':>12} {'compiled':>12} {'speedup':>10}")
+
+    for extra_terms in (0, 100, 1000, 5000, 10000):
+        doctor = AIDoctor()
+        grow_vocabulary(doctor, extra_terms)
+        terms = len(doctor.symptom_database) + sum(len(v) for v in doctor.symptom_variations.values())
+
+        for message in MESSAGES:
+            expected = legacy_match(doctor, message)
+            actual = doctor.analyze_symptoms(message)['matched_symptoms']
+            assert expected == actual, (message, expected, actual)
+
+        rounds = max(1, 2000 // (1 + extra_terms // 100))
+        legacy = time_per_message(lambda m: legacy_match(doctor, m), rounds)
+        compiled = time_per_message(lambda m: doctor.symptom_matcher.find(m.lower()), rounds)
+        print(f"{terms:>8} {legacy:>12.1f} {compiled:>12.1f} {legacy / compiled:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, Iterable, List, Optional
+
+
+class ConversationContext:
+    """
+    Incrementally maintained state of one chat session: a rolling window of
+    the most recent user messages and every symptom detected so far.
+    """
+
+    def __init__(self, window: int = 10):
+        self.recent_user_messages = deque(maxlen=window)
+        self.symptoms: List[str] = []
+        self.user_message_count = 0
+
+    def add_user_message(self, message: str, symptoms: Iterable[str]):
+        """Record a user turn and merge the symptoms detected in it"""
+        self.recent_user_messages.append(message)
+        for symptom in symptoms:
+            if symptom not in self.symptoms:
+                self.symptoms.append(symptom)
+        self.user_message_count += 1
+
+    def history(self) -> List[Dict]:
+        """Recent user turns in the format AIDoctor.get_medical_response reads"""
+        return [{"role": "user", "message": message} for message in self.recent_user_messages]
+
+
+class ChatContextCache:
+    """
+    Bounded LRU cache of ConversationContext objects keyed by chat session id.
+
+    The cache is per process, so with several workers another process may
+    have handled turns of a cached session. Callers pass the session's
+    stored user message count to ``get``; a context that has seen a
+    different number of turns is dropped as stale and rebuilt by the caller.
+    """
+
+    def __init__(self, max_sessions: int = 10000, window: int = 10):
+        self.max_sessions = max_sessions
+        self.window = window
+        self._contexts: "OrderedDict[str, ConversationContext]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def get(self, session_id: str, user_message_count: Optional[int] = None) -> Optional[ConversationContext]:
+        with self._lock:
+            context = self._contexts.get(session_id)
+            if context is None:
+                self.misses += 1
+                return None
+            if user_message_count is not None and context.user_message_count != user_message_count:
+                del self._contexts[session_id]
+                self.stale += 1
+                return None
+            self._contexts.move_to_end(session_id)
+            self.hits += 1
+            return context
+
+    def new(self, session_id: str) -> ConversationContext:
+        """Create, cache and return an empty context for ``session_id``"""
+        context = ConversationContext(self.window)
+        with self._lock:
+            self._contexts[session_id] = context
+            self._contexts.move_to_end(session_id)
+            while len(self._contexts) > self.max_sessions:
+                self._contexts.popitem(last=False)
+        return context
+
+    def discard(self, session_id: str):
+        with self._lock:
+            self._contexts.pop(session_id, None)
@@ -0,0 +1,253 @@
+"""
+Write-behind persistence for chat messages
+
+A chat turn writes two ChatMessage rows and touches its ChatSession's
+last_activity. Committing that per request costs one fsync per turn on
+SQLite. ChatWriter queues the writes instead, and a background thread
+commits everything queued within ``interval_ms`` (or ``max_rows`` rows)
+in a single transaction.
+
+Timestamps are taken when a turn is queued, so stored order matches the
+order of the requests. Callers that must read their own writes pass
+``durable=True`` (wait until the turn is committed) or call ``flush()``
+before reading. ``flush()`` only covers this process's queue: with several
+worker processes, a read served by another worker does not see turns still
+queued here (for up to ``interval_ms``) unless the writer is created with
+``durable=True``, which makes every turn wait for its batch's commit.
+
+If a batch fails, its turns are retried one by one so that a single bad
+turn (e.g. an unknown session id) does not lose everyone else's; turns
+that still fail are logged. Queued turns are flushed at interpreter exit.
+"""
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, insert, update
+
+logger = logging.getLogger(__name__)
+
+
+class ChatWriter:
+    """
+    Batches chat writes from many requests into one transaction.
+
+    ``message_table`` and ``session_table`` are the ChatMessage and
+    ChatSession tables. ``start(engine)`` binds the database and starts
+    the writer thread (no-op once running). With ``enabled=False`` every
+    turn is committed by the caller, as before. With ``durable=True``
+    turns are still committed in batches, but ``record_turn`` waits for
+    the commit by default.
+    """
+
+    def __init__(self, message_table, session_table, interval_ms: float = 20.0, max_rows: int = 500,
+                 max_pending: int = 10000, enabled: bool = True, shutdown_timeout: float = 10.0,
+                 durable: bool = False):
+        self.message_table = message_table
+        self.session_table = session_table
+        self.interval = interval_ms / 1000.0
+        self.max_rows = max_rows
+        self.enabled = enabled
+        self.durable = durable
+        self.shutdown_timeout = shutdown_timeout
+        self.engine = None
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._last_future: Optional[Future] = None
+        self._lock = threading.Lock()
+        # Turns queued but not yet committed (or failed), per chat session
+        self._pending_turns: Dict[str, int] = {}
+        self._pending_lock = threading.Lock()
+
+        self.batches = 0
+        self.turns_written = 0
+        self.rows_written = 0
+        self.failures = 0  # turns that could not be written
+        self.retried_batches = 0
+
+        self._touch = (
+            update(session_table)
+            .where(session_table.c.session_id == bindparam('b_session_id'))
+            .values(last_activity=bindparam('b_last_activity'))
+        )
+
+        if hasattr(os, 'register_at_fork'):
+            # The writer thread does not survive a fork; the child starts its own
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._thread = None
+        self._last_future = None
+        self._lock = threading.Lock()
+        self._pending_turns = {}
+        self._pending_lock = threading.Lock()
+
+    def start(self, engine):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            self.engine = engine
+            if not self.enabled or (self._thread is not None and self._thread.is_alive()):
+                return
+            self._thread = threading.Thread(target=self._run, name='chat-writer', daemon=True)
+            self._thread.start()
+            # The thread is a daemon, so write out what is still queued before exit
+            atexit.register(self._flush_at_exit)
+
+    def _flush_at_exit(self):
+        if not self.flush(self.shutdown_timeout):
+            logger.error(f"Chat writer: {self._queue.qsize()} queued turns not written at shutdown")
+
+    def record_turn(self, session_id: str, user_content: str, ai_content: str,
+                    received_at: Optional[datetime] = None, durable: Optional[bool] = None,
+                    timeout: Optional[float] = None) -> Future:
+        """
+        Queue one chat turn: the user message, the AI reply and the session's
+        last_activity. Returns a Future that completes when it is committed;
+        with ``durable=True`` (default: the writer's ``durable``) this waits
+        for the commit and raises if it failed.
+        """
+        now = datetime.utcnow()
+        turn = {
+            'messages': [
+                {'session_id': session_id, 'message_type': 'user', 'content': user_content,
+                 'timestamp': received_at or now},
+                {'session_id': session_id, 'message_type': 'ai', 'content': ai_content, 'timestamp': now},
+            ],
+            'session_id': session_id,
+            'last_activity': now,
+        }
+        future: Future = Future()
+
+        if not self.enabled:
+            self._write([turn])
+            self.batches += 1
+            self._count([turn])
+            future.set_result(None)
+            return future
+
+        with self._pending_lock:
+            self._pending_turns[session_id] = self._pending_turns.get(session_id, 0) + 1
+        future.add_done_callback(lambda _: self._settle(session_id))
+        with self._lock:
+            # Put under the lock so _last_future is always the newest turn
+            self._queue.put((turn, future))
+            self._last_future = future
+        if self.durable if durable is None else durable:
+            future.result(timeout)
+        return future
+
+    def _settle(self, session_id: str):
+        with self._pending_lock:
+            remaining = self._pending_turns.get(session_id, 0) - 1
+            if remaining > 0:
+                self._pending_turns[session_id] = remaining
+            else:
+                self._pending_turns.pop(session_id, None)
+
+    def pending_turns(self, session_id: str) -> int:
+        """Turns of ``session_id`` queued in this process and not yet committed"""
+        return self._pending_turns.get(session_id, 0)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every turn queued so far is committed (or failed); False on timeout"""
+        future = self._last_future
+        if future is None or future.done():
+            return True
+        try:
+            future.exception(timeout)
+        except TimeoutError:
+            return False
+        return True
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            rows = len(items[0][0]['messages'])
+            while rows < self.max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                items.append(item)
+                rows += len(item[0]['messages'])
+            self._commit(items)
+
+    def _commit(self, items):
+        turns = [turn for turn, _ in items]
+        try:
+            self._write(turns)
+        except Exception as e:
+            if len(items) == 1:
+                self._fail(items[0], e)
+                return
+            # Retry each turn alone so one bad turn does not sink the batch
+            self.retried_batches += 1
+            logger.warning(f"Chat write batch of {len(turns)} turns failed, retrying each turn: {e}")
+            for item in items:
+                self._commit_one(item)
+            return
+        self.batches += 1
+        self._count(turns)
+        for _, future in items:
+            future.set_result(None)
+
+    def _commit_one(self, item):
+        turn, future = item
+        try:
+            self._write([turn])
+        except Exception as e:
+            self._fail(item, e)
+            return
+        self.batches += 1
+        self._count([turn])
+        future.set_result(None)
+
+    def _fail(self, item, error):
+        turn, future = item
+        self.failures += 1
+        logger.error(f"Chat turn for session {turn['session_id']} could not be written: {error}")
+        future.set_exception(error)
+
+    def _write(self, turns: List[Dict[str, Any]]):
+        messages = [message for turn in turns for message in turn['messages']]
+        last_activity = {}
+        for turn in turns:
+            last_activity[turn['session_id']] = turn['last_activity']
+        with self.engine.begin() as conn:
+            conn.execute(insert(self.message_table), messages)
+            conn.execute(self._touch, [
+                {'b_session_id': session_id, 'b_last_activity': timestamp}
+                for session_id, timestamp in last_activity.items()
+            ])
+
+    def _count(self, turns):
+        self.turns_written += len(turns)
+        self.rows_written += sum(len(turn['messages']) for turn in turns)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'durable': self.durable,
+            'interval_ms': self.interval * 1000,
+            'max_rows': self.max_rows,
+            'pending': self._queue.qsize(),
+            'batches': self.batches,
+            'turns_written': self.turns_written,
+            'rows_written': self.rows_written,
+            'failures': self.failures,
+            'retried_batches': self.retried_batches,
+        }
@@ -0,0 +1,162 @@
+"""
+Read/write routing between the primary database and a read replica
+
+Views that only read (the dashboard, consultation history, chat history,
+payment history) are marked with ``@read_replica`` or run their queries
+inside ``use_replica()``. While that is active, the session sends SELECTs
+to the ``replica`` bind; flushes, INSERT/UPDATE/DELETE and every other
+view keep using the primary.
+
+Read-your-writes: after a request that writes (a POST/PUT/PATCH/DELETE,
+or any ORM flush with changes), the browser session records the time,
+and for DATABASE_REPLICA_WINDOW seconds that user's reads stay on the
+primary, so they see their own changes even if the replica lags.
+
+Routing is off unless DATABASE_REPLICA_URL is set. For local testing the
+replica can be a second SQLite file refreshed from the primary with
+``python db_routing.py`` (see copy_sqlite()).
+"""
+
+import functools
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from flask import current_app, g, has_app_context, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+from db_profiles import engine_options, get_profile
+
+REPLICA_BIND = 'replica'
+USE_REPLICA = 'use_replica'
+
+# Seconds a user's reads stay on the primary after they write
+DEFAULT_WINDOW = 5.0
+
+# Flask-SQLAlchemy resolves relative SQLite paths against the instance folder
+INSTANCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+WRITE_AT_KEY = '_db_write_at'
+
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that reads from the replica while ``use_replica`` is set"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get(USE_REPLICA) and not self._flushing \
+                and not isinstance(clause, UpdateBase):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_write(db_session, flush_context):
+    # Any flush reaching the database counts as a write by this request
+    if has_app_context():
+        g._db_wrote = True
+
+
+def replica_enabled() -> bool:
+    return has_app_context() and REPLICA_BIND in current_app.config.get('SQLALCHEMY_BINDS', {})
+
+
+def recent_write() -> bool:
+    """True if this request or one within the read-your-writes window wrote"""
+    if g.get('_db_wrote'):
+        return True
+    if not has_request_context():
+        return False
+    window = current_app.config.get('DATABASE_REPLICA_WINDOW', DEFAULT_WINDOW)
+    return session.get(WRITE_AT_KEY, 0) > time.time() - window
+
+
+@contextmanager
+def use_replica():
+    """Send the reads in this block to the replica (unless the user just wrote)"""
+    if not replica_enabled() or recent_write():
+        yield
+        return
+    db_session = current_app.extensions['sqlalchemy'].session
+    previous = db_session.info.get(USE_REPLICA, False)
+    db_session.info[USE_REPLICA] = True
+    try:
+        yield
+    finally:
+        db_session.info[USE_REPLICA] = previous
+
+
+def read_replica(view):
+    """Decorator for read-only views"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with use_replica():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+def _remember_write(response):
+    if (g.get('_db_wrote') or request.method not in SAFE_METHODS) and response.status_code < 400:
+        session[WRITE_AT_KEY] = time.time()
+    return response
+
+
+def init_routing(app, replica_url: Optional[str] = None, profile: Optional[str] = None):
+    """
+    Add the replica bind (DATABASE_REPLICA_URL) and the read-your-writes
+    hook to ``app``. Call before db.init_app / init_db.
+    """
+    replica_url = replica_url or os.environ.get('DATABASE_REPLICA_URL')
+    if not replica_url:
+        return
+    binds = dict(app.config.get('SQLALCHEMY_BINDS', {}))
+    binds[REPLICA_BIND] = {'url': replica_url, **engine_options(replica_url, get_profile(profile))}
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.config.setdefault('DATABASE_REPLICA_WINDOW',
+                          float(os.environ.get('DATABASE_REPLICA_WINDOW', DEFAULT_WINDOW)))
+    app.after_request(_remember_write)
+
+
+def _sqlite_path(url: str) -> str:
+    parsed = make_url(url)
+    if parsed.get_backend_name() != 'sqlite' or not parsed.database or parsed.database == ':memory:':
+        raise ValueError(f"{url!r} is not a SQLite file URL")
+    return parsed.database if os.path.isabs(parsed.database) else os.path.join(INSTANCE_DIR, parsed.database)
+
+
+def copy_sqlite(primary_url: str, replica_url: str):
+    """Refresh a SQLite replica file with a consistent copy of the primary"""
+    source = sqlite3.connect(_sqlite_path(primary_url))
+    target = sqlite3.connect(_sqlite_path(replica_url))
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Copy the primary SQLite database to the replica file")
+    parser.add_argument('--primary', default=os.environ.get('DATABASE_URL', 'sqlite:///health_assistant.db'))
+    parser.add_argument('--replica', default=os.environ.get('DATABASE_REPLICA_URL'))
+    parser.add_argument('--interval', type=float, default=0,
+                        help='keep copying every N seconds (simulates replication lag)')
+    args = parser.parse_args()
+    if not args.replica:
+        parser.error("set DATABASE_REPLICA_URL or pass --replica")
+
+    while True:
+        copy_sqlite(args.primary, args.replica)
+        print(f"Copied {args.primary} -> {args.replica}")
+        if args.interval <= 0:
+            break
+        time.sleep(args.interval)
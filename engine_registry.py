@@ -0,0 +1,166 @@
+"""
+Process-wide registry of the analysis engines and services
+
+Each engine (the doctor engines, the symptom analyzer, the payment service,
+the Hugging Face model manager) is built at most once per process and shared
+by every module that asks for it. Getting the engines before the web server
+forks its workers (e.g. ``registry.preload()`` from a gunicorn ``on_starting``
+hook, or ``gunicorn --preload``) builds them once in the master, and the
+workers share those pages copy-on-write.
+
+Construction time and memory are recorded per engine for the diagnostics
+endpoints (/ai-doctor/engines, /ai_doctor/engines).
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _rss_bytes() -> Optional[int]:
+    """Resident set size of this process (Linux only)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class EngineRegistry:
+    """
+    Builds registered engines on first use and hands out the same instance
+    afterwards.
+
+    ``register(name, factory)`` adds a zero-argument factory. ``get(name)``
+    returns the engine, replacing it first through its ``refreshed()``
+    method when it has one (e.g. after a knowledge base reload). Rebuilds
+    are recorded like the first construction.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._engines: Dict[str, Any] = {}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """Register (or replace) the factory for an engine; a built engine is kept"""
+        with self._lock:
+            self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        engine = self._engines.get(name)
+        if engine is None:
+            with self._lock:
+                engine = self._engines.get(name)
+                if engine is None:
+                    if name not in self._factories:
+                        raise KeyError(f"No engine registered as {name!r}")
+                    engine = self._build(name, self._factories[name])
+        refreshed = getattr(engine, 'refreshed', None)
+        if refreshed is not None:
+            current = refreshed()
+            if current is not engine:
+                with self._lock:
+                    if self._engines.get(name) is engine:
+                        self._engines[name] = current
+                        self._stats[name]['rebuilds'] += 1
+                    engine = self._engines[name]
+        return engine
+
+    def _build(self, name: str, factory: Callable[[], Any]) -> Any:
+        tracing = not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        rss_before = _rss_bytes()
+        traced_before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            engine = factory()
+        finally:
+            build_time = time.perf_counter() - start
+            traced = tracemalloc.get_traced_memory()[0] - traced_before
+            if tracing:
+                tracemalloc.stop()
+        rss_after = _rss_bytes()
+
+        self._engines[name] = engine
+        self._stats[name] = {
+            'type': f"{type(engine).__module__}.{type(engine).__name__}",
+            'build_time_ms': round(build_time * 1000, 2),
+            # Python allocations made while building (not freed by the end)
+            'python_bytes': traced,
+            # Includes native allocations, e.g. model weights
+            'rss_delta_bytes': rss_after - rss_before if rss_before is not None and rss_after is not None else None,
+            'built_in_pid': os.getpid(),
+            'built_at': time.time(),
+            'rebuilds': 0,
+        }
+        logger.info(f"Built engine {name} in {build_time * 1000:.1f}ms")
+        return engine
+
+    def preload(self, names: Optional[Iterable[str]] = None):
+        """Build engines now (e.g. before forking workers); failures are logged, not raised"""
+        for name in list(names or self._factories):
+            try:
+                self.get(name)
+            except Exception as e:
+                logger.error(f"Could not build engine {name}: {e}")
+
+    def is_built(self, name: str) -> bool:
+        return name in self._engines
+
+    def get_stats(self) -> Dict[str, Any]:
+        pid = os.getpid()
+        engines = {}
+        for name in self._factories:
+            stats = self._stats.get(name)
+            if stats is None:
+                engines[name] = {'built': False}
+            else:
+                # Built in another pid: inherited from the parent before the fork
+                engines[name] = dict(stats, built=True, shared_from_parent=stats['built_in_pid'] != pid)
+        return {'pid': pid, 'rss_bytes': _rss_bytes(), 'engines': engines}
+
+
+def _doctor():
+    from ai_doctor import AIDoctor
+    return AIDoctor()
+
+
+def _symptom_analyzer():
+    from symptom_analyzer import SymptomAnalyzer
+    return SymptomAnalyzer()
+
+
+def _payment_service():
+    from payment_service import PaymentService
+    return PaymentService()
+
+
+def _model_manager():
+    models_dir = os.path.join(BASE_DIR, 'models')
+    if models_dir not in sys.path:
+        sys.path.append(models_dir)
+    from huggingface_integration import model_manager
+    return model_manager
+
+
+registry = EngineRegistry()
+registry.register('doctor', _doctor)
+registry.register('symptom_analyzer', _symptom_analyzer)
+registry.register('payment_service', _payment_service)
+registry.register('model_manager', _model_manager)
+
+
+def get_engine(name: str) -> Any:
+    """The shared engine registered as ``name``"""
+    return registry.get(name)
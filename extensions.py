@@ -1,3 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from db_routing import RoutingSession
 
-db = SQLAlchemy()
+# RoutingSession sends reads in read-only views to the replica bind, if configured
+db = SQLAlchemy(session_options={'class_': RoutingSession})
@@ -2,9 +2,12 @@ import os
 import logging
 import json
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from werkzeug.middleware.proxy_fix import ProxyFix
+from extensions import db
+from db_profiles import init_db
+from db_routing import init_routing
+from analysis_pool import start_analysis_pool
 
 # Try to load dotenv, but don't fail if it's not available
 try:
@@ -17,7 +20,6 @@ except ImportError:
 logging.basicConfig(level=logging.DEBUG)
 
 # Initialize extensions
-db = SQLAlchemy()
 login_manager = LoginManager()
 
 def create_app():
@@ -45,6 +47,9 @@ def create_app():
     }
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
+    # Page size for the keyset-paginated dashboard and history lists
+    app.config["CONSULTATIONS_PAGE_SIZE"] = int(os.environ.get("CONSULTATIONS_PAGE_SIZE", 20))
+
     # Configure Stripe (with fallback values)
     app.config["STRIPE_PUBLISHABLE_KEY"] = os.environ.get("STRIPE_PUBLISHABLE_KEY", "pk_test_your_publishable_key_here")
     app.config["STRIPE_SECRET_KEY"] = os.environ.get("STRIPE_SECRET_KEY", "sk_test_your_secret_key_here")
@@ -52,8 +57,11 @@ def create_app():
     # Configure OpenAI (with fallback values)
     app.config["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY", "your_openai_api_key_here")
 
-    # Initialize extensions
-    db.init_app(app)
+    # Read-only views go to DATABASE_REPLICA_URL when it is set
+    init_routing(app)
+
+    # Initialize extensions (DB_PROFILE=sqlite-prod enables WAL and a thread-safe pool)
+    init_db(app, db)
     login_manager.init_app(app)
     login_manager.login_view = 'main.login'
     login_manager.login_message = 'Please log in to access this page.'
@@ -79,6 +87,9 @@ def create_app():
             # Import basic routes only
             from routes import login, register, logout, index, dashboard, symptoms, results, history, profile
 
+    # Load the model and fork the analysis workers once, before serving
+    start_analysis_pool()
+
     return app
 
 # Create the app instance
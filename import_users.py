@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+One-shot importer for users_data.pkl
+Streams the pickled users (snapshot plus journal) into the SQL user table
+in chunked executemany batches
+"""
+
+import argparse
+import os
+import pickle
+from datetime import datetime
+from itertools import islice
+from flask import Flask
+from sqlalchemy import insert, or_, select
+from db_profiles import init_db
+from extensions import db
+from models import User
+
+USER_COLUMNS = [
+    'id', 'email', 'first_name', 'last_name', 'age', 'gender', 'password_hash',
+    'created_at', 'last_login', 'free_consultations_used', 'subscription_status',
+    'subscription_expires'
+]
+
+def create_import_app(database_url=None):
+    """
+    Bare Flask app bound to the user database. Importing app.py would also
+    build the analysis engines and start the model and worker pool.
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url or os.environ.get('DATABASE_URL', 'sqlite:///health_assistant.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    init_db(app, db)
+    return app
+
+class PickledUser:
+    """Plain attribute holder for users unpickled from users_data.pkl"""
+
+class LegacyUnpickler(pickle.Unpickler):
+    """Load pickled ``User`` objects as PickledUser, whatever module they were saved from"""
+
+    def find_class(self, module, name):
+        # Users pickled while running ``python app.py`` refer to __main__.User
+        if name == 'User':
+            return PickledUser
+        return super().find_class(module, name)
+
+def load_legacy_users(snapshot_path, journal_path=None):
+    """
+    Users by id from the legacy snapshot (``{'users': {email: user}, ...}``)
+    and its append-only journal of ``('put', user)`` records, replayed in
+    order. A torn record at the end of the journal is ignored.
+    """
+    journal_path = journal_path or os.path.splitext(snapshot_path)[0] + '.journal'
+    users = {}
+
+    if os.path.exists(snapshot_path):
+        with open(snapshot_path, 'rb') as f:
+            data = LegacyUnpickler(f).load()
+        for user in data.get('users', {}).values():
+            users[user.id] = user
+        print(f"✅ Loaded {len(users)} users from {snapshot_path}")
+
+    if os.path.exists(journal_path):
+        records = 0
+        with open(journal_path, 'rb') as f:
+            unpickler = LegacyUnpickler(f)
+            while True:
+                try:
+                    op, user = unpickler.load()
+                except EOFError:
+                    break
+                except Exception as e:
+                    print(f"⚠️ Ignoring damaged user journal tail: {e}")
+                    break
+                if op == 'put':
+                    users[user.id] = user
+                records += 1
+        print(f"✅ Replayed {records} user journal records")
+
+    return users
+
+def iter_user_rows(users):
+    """Yield one column dict per pickled user, oldest id first"""
+    for user_id in sorted(users):
+        user = users[user_id]
+        row = {column: getattr(user, column, None) for column in USER_COLUMNS}
+        if row['free_consultations_used'] is None:
+            row['free_consultations_used'] = 0
+        if row['subscription_status'] is None:
+            row['subscription_status'] = 'free'
+        if row['created_at'] is None:
+            row['created_at'] = datetime.utcnow()
+        yield row
+
+def import_chunk(rows):
+    """Insert one chunk, skipping known emails and reassigning taken ids"""
+    emails = [row['email'] for row in rows]
+    ids = [row['id'] for row in rows]
+    existing = db.session.execute(
+        select(User.id, User.email).where(or_(User.email.in_(emails), User.id.in_(ids)))
+    ).all()
+    existing_emails = {email for _, email in existing}
+    existing_ids = {user_id for user_id, _ in existing}
+
+    keep_id = []
+    new_id = []
+    for row in rows:
+        if row['email'] in existing_emails:
+            continue
+        if row['id'] in existing_ids:
+            row = dict(row)
+            del row['id']
+            new_id.append(row)
+        else:
+            keep_id.append(row)
+
+    # Each execute with a list of parameter dicts runs as one executemany
+    if keep_id:
+        db.session.execute(insert(User.__table__), keep_id)
+    if new_id:
+        db.session.execute(insert(User.__table__), new_id)
+    db.session.commit()
+    return len(keep_id) + len(new_id), len(rows) - len(keep_id) - len(new_id)
+
+def import_users(snapshot_path='users_data.pkl', journal_path=None, chunk_size=1000, database_url=None):
+    """Import every pickled user into the database"""
+    print("Starting user import...")
+
+    if not os.path.exists(snapshot_path) and not (journal_path and os.path.exists(journal_path)):
+        print(f"📝 Nothing to import: {snapshot_path} not found")
+        return 0
+
+    rows = iter_user_rows(load_legacy_users(snapshot_path, journal_path))
+    imported = skipped = 0
+
+    app = create_import_app(database_url)
+    with app.app_context():
+        db.create_all()
+        try:
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                added, already_there = import_chunk(chunk)
+                imported += added
+                skipped += already_there
+                print(f"  ... {imported} imported, {skipped} already present")
+        except Exception as e:
+            print(f"Error during user import: {e}")
+            db.session.rollback()
+            raise
+
+    print(f"✅ Imported {imported} users ({skipped} skipped)")
+    return imported
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import users_data.pkl into the SQL user table")
+    parser.add_argument('--snapshot', default='users_data.pkl')
+    parser.add_argument('--journal', default=None)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    parser.add_argument('--database-url', default=None, help='default: DATABASE_URL or the app database')
+    args = parser.parse_args()
+    import_users(args.snapshot, args.journal, args.chunk_size, args.database_url)
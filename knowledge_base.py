@@ -0,0 +1,256 @@
+"""
+Medical knowledge base shared by the doctor engines and the symptom analyzer
+
+The source is data/knowledge_base.json. It is compiled once into a binary
+snapshot (instance/knowledge_base.kb): a header, the interned symptom table
+and the condition x symptom membership arrays (CSR), then the remaining
+data marshalled. Opening the snapshot maps it with mmap and reads the
+arrays in place, so loading it in a new worker or after a change costs
+little more than the file access.
+
+get_knowledge_base() returns the current snapshot. At most every
+KNOWLEDGE_BASE_CHECK_INTERVAL seconds it checks the source file; when the
+source changed, it is recompiled (written to a temporary file, then
+renamed over the old snapshot) and the new snapshot replaces the current
+one. Requests keep the snapshot they started with. Engines built from an
+older snapshot are replaced through their refreshed() method.
+
+    python knowledge_base.py          # compile the snapshot
+"""
+
+import array
+import json
+import logging
+import marshal
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SOURCE_PATH = os.environ.get('KNOWLEDGE_BASE_PATH', os.path.join(BASE_DIR, 'data', 'knowledge_base.json'))
+SNAPSHOT_PATH = os.environ.get('KNOWLEDGE_BASE_SNAPSHOT', os.path.join(BASE_DIR, 'instance', 'knowledge_base.kb'))
+CHECK_INTERVAL = float(os.environ.get('KNOWLEDGE_BASE_CHECK_INTERVAL', 2.0))
+
+MAGIC = b'HAKB'
+FORMAT_VERSION = 1
+# Arrays are stored in native byte order and the data with marshal, so a
+# snapshot is only read back by the same interpreter version and byte order
+COMPATIBILITY_TAG = f"{sys.implementation.cache_tag}-{sys.byteorder}".encode()[:16]
+
+# magic, format version, compatibility tag, source mtime_ns and size,
+# symptom count, condition count, membership count, symptom name bytes, data bytes
+HEADER = struct.Struct('<4sH16sQQIIIII')
+SECTIONS = ('diagnosis', 'consultation', 'conditions')
+
+
+def _padded(size: int) -> int:
+    return (size + 3) & ~3
+
+
+def _fingerprint(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def compile_snapshot(source_path: str = SOURCE_PATH, snapshot_path: str = SNAPSHOT_PATH) -> Tuple[int, int]:
+    """Compile the JSON knowledge base into a snapshot; returns the source fingerprint"""
+    with open(source_path, encoding='utf-8') as f:
+        stat = os.fstat(f.fileno())
+        data = json.load(f)
+    missing = [section for section in SECTIONS if section not in data]
+    if missing:
+        raise ValueError(f"{source_path} is missing sections: {', '.join(missing)}")
+
+    # Intern condition symptoms in order of first appearance
+    symptom_ids = {}
+    indptr = array.array('I', [0])
+    indices = array.array('I')
+    conditions = {}
+    for condition_id, condition in data['conditions'].items():
+        for symptom in condition['symptoms']:
+            indices.append(symptom_ids.setdefault(symptom, len(symptom_ids)))
+        indptr.append(len(indices))
+        conditions[condition_id] = {key: value for key, value in condition.items() if key != 'symptoms'}
+
+    names = b''.join(name.encode('utf-8') for name in symptom_ids)
+    name_offsets = array.array('I', [0])
+    for name in symptom_ids:
+        name_offsets.append(name_offsets[-1] + len(name.encode('utf-8')))
+    payload = marshal.dumps({
+        'diagnosis': data['diagnosis'],
+        'consultation': data['consultation'],
+        'conditions': conditions,
+    })
+
+    header = HEADER.pack(
+        MAGIC, FORMAT_VERSION, COMPATIBILITY_TAG, stat.st_mtime_ns, stat.st_size,
+        len(symptom_ids), len(conditions), len(indices), len(names), len(payload)
+    )
+    directory = os.path.dirname(os.path.abspath(snapshot_path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.knowledge_base.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(name_offsets.tobytes())
+            f.write(names.ljust(_padded(len(names)), b'\0'))
+            f.write(indptr.tobytes())
+            f.write(indices.tobytes())
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        # Readers see either the old snapshot or the new one, never a partial file
+        os.replace(tmp_path, snapshot_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return stat.st_mtime_ns, stat.st_size
+
+
+class KnowledgeBase:
+    """
+    One loaded snapshot. Its data is read-only and shared by every engine
+    built from it.
+
+    diagnosis, consultation and conditions are the sections of the source
+    file; symptom_names and symptom_ids intern the condition symptoms, and
+    membership_indptr / membership_indices list each condition's symptom
+    ids (duplicates kept) as views into the mapped file.
+    """
+
+    def __init__(self, path: str, fingerprint: Tuple[int, int], symptom_names: Tuple[str, ...],
+                 membership_indptr: memoryview, membership_indices: memoryview, sections: Dict[str, Any]):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.symptom_names = symptom_names
+        self.symptom_ids = {name: symptom_id for symptom_id, name in enumerate(symptom_names)}
+        self.membership_indptr = membership_indptr
+        self.membership_indices = membership_indices
+        self.diagnosis = sections['diagnosis']
+        self.consultation = sections['consultation']
+        self.conditions = sections['conditions']
+        self.condition_ids = list(self.conditions)
+        for row, condition in enumerate(self.conditions.values()):
+            condition['symptoms'] = [symptom_names[i] for i in self.condition_symptom_ids(row)]
+
+        self._derived: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def condition_symptom_ids(self, row: int) -> memoryview:
+        return self.membership_indices[self.membership_indptr[row]:self.membership_indptr[row + 1]]
+
+    def derived(self, key: str, build: Callable[[], Any]) -> Any:
+        """Build an object from this snapshot once (indexes, templates, matrices) and share it"""
+        try:
+            return self._derived[key]
+        except KeyError:
+            pass
+        with self._lock:
+            if key not in self._derived:
+                self._derived[key] = build()
+            return self._derived[key]
+
+
+def open_snapshot(snapshot_path: str = SNAPSHOT_PATH,
+                  fingerprint: Optional[Tuple[int, int]] = None) -> Optional[KnowledgeBase]:
+    """
+    Map a compiled snapshot. Returns None if it is missing, was written by
+    another interpreter, or (when ``fingerprint`` is given) was compiled
+    from a different version of the source.
+    """
+    try:
+        with open(snapshot_path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    if len(buffer) < HEADER.size:
+        return None
+    (magic, version, tag, mtime_ns, size, symptom_count, condition_count,
+     membership_count, names_size, payload_size) = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != FORMAT_VERSION or tag.rstrip(b'\0') != COMPATIBILITY_TAG:
+        return None
+    if fingerprint is not None and (mtime_ns, size) != tuple(fingerprint):
+        return None
+
+    view = memoryview(buffer)
+    offset = HEADER.size
+
+    def take(count, padded=False):
+        nonlocal offset
+        start = offset
+        offset += _padded(count) if padded else count
+        return view[start:start + count]
+
+    name_offsets = take((symptom_count + 1) * 4).cast('I')
+    names = take(names_size, padded=True)
+    indptr = take((condition_count + 1) * 4).cast('I')
+    indices = take(membership_count * 4).cast('I')
+    sections = marshal.loads(take(payload_size))
+
+    symptom_names = tuple(
+        sys.intern(str(names[name_offsets[i]:name_offsets[i + 1]], 'utf-8')) for i in range(symptom_count)
+    )
+    return KnowledgeBase(snapshot_path, (mtime_ns, size), symptom_names, indptr, indices, sections)
+
+
+def load_knowledge_base(source_path: str = SOURCE_PATH, snapshot_path: str = SNAPSHOT_PATH) -> KnowledgeBase:
+    """Open the snapshot for the current source, compiling it first if it is missing or stale"""
+    knowledge_base = open_snapshot(snapshot_path, _fingerprint(source_path))
+    if knowledge_base is None:
+        fingerprint = compile_snapshot(source_path, snapshot_path)
+        knowledge_base = open_snapshot(snapshot_path, fingerprint)
+    if knowledge_base is None:
+        raise ValueError(f"Could not load knowledge base snapshot {snapshot_path}")
+    return knowledge_base
+
+
+_current: Optional[KnowledgeBase] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def _reset_lock():
+    global _lock
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    # A forked analysis worker must not inherit the lock held mid-reload
+    os.register_at_fork(after_in_child=_reset_lock)
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """The current knowledge base, reloaded if the source file changed"""
+    global _current, _checked_at
+    knowledge_base = _current
+    if knowledge_base is not None and time.monotonic() - _checked_at < CHECK_INTERVAL:
+        return knowledge_base
+
+    with _lock:
+        if _current is not None and time.monotonic() - _checked_at < CHECK_INTERVAL:
+            return _current
+        try:
+            if _current is None or _fingerprint(SOURCE_PATH) != _current.fingerprint:
+                _current = load_knowledge_base()
+                logger.info(f"Loaded knowledge base snapshot {_current.path}")
+        except (OSError, ValueError) as e:
+            # Keep serving the last good snapshot (e.g. while the file is being edited)
+            if _current is None:
+                raise
+            logger.error(f"Knowledge base reload failed, keeping the loaded version: {e}")
+        _checked_at = time.monotonic()
+        return _current
+
+
+if __name__ == '__main__':
+    compile_snapshot()
+    knowledge_base = open_snapshot()
+    print(f"Compiled {SOURCE_PATH} -> {SNAPSHOT_PATH} ({os.path.getsize(SNAPSHOT_PATH)} bytes, "
+          f"{len(knowledge_base.condition_ids)} conditions, {len(knowledge_base.symptom_names)} symptoms)")
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 """
 Database migration script for Health Assistant
-Adds new tables and columns for AI doctor, payments, and pricing features
+Adds new tables, columns and indexes for AI doctor, payments, and pricing features
 """
 
 import os
@@ -58,6 +58,13 @@ def migrate_database():
             print("Creating new tables...")
             db.create_all()
             
+            # create_all skips tables that already exist, so add any missing
+            # indexes on the hot query paths explicitly
+            print("Creating indexes...")
+            for model in (Consultation, ChatMessage, Payment):
+                for index in model.__table__.indexes:
+                    index.create(bind=engine, checkfirst=True)
+            
             # Insert default pricing plans
             print("Inserting default pricing plans...")
             plans = [
@@ -1,22 +1,25 @@
 from datetime import datetime
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import load_only
+from extensions import db
 
-# This will be a simple User class for now
-class User(UserMixin):
-    def __init__(self, id, email, first_name, last_name, age, gender):
-        self.id = id
-        self.email = email
-        self.first_name = first_name
-        self.last_name = last_name
-        self.age = age
-        self.gender = gender
-        self.password_hash = None
-        self.created_at = datetime.utcnow()
-        self.last_login = None
-        self.free_consultations_used = 0
-        self.subscription_status = 'free'
-        self.subscription_expires = None
+class User(UserMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), unique=True, nullable=False, index=True)
+    first_name = db.Column(db.String(50))
+    last_name = db.Column(db.String(50))
+    age = db.Column(db.Integer)
+    gender = db.Column(db.String(10))
+    password_hash = db.Column(db.String(256))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_login = db.Column(db.DateTime)
+    free_consultations_used = db.Column(db.Integer, default=0, nullable=False)
+    subscription_status = db.Column(db.String(20), default='free')  # free, premium
+    subscription_expires = db.Column(db.DateTime)
+
+    FREE_CONSULTATIONS = 1  # per account
     
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
@@ -25,7 +28,7 @@ class User(UserMixin):
         return check_password_hash(self.password_hash, password)
     
     def can_use_free_consultation(self):
-        return self.free_consultations_used < 1
+        return (self.free_consultations_used or 0) < self.FREE_CONSULTATIONS
     
     def has_active_subscription(self):
         if self.subscription_status == 'premium':
@@ -38,27 +41,6 @@ class User(UserMixin):
     def __repr__(self):
         return f'<User {self.email}>'
 
-# Simple in-memory storage for users (in a real app, this would be a database)
-users_db = {}
-user_id_counter = 1
-
-def create_user(email, first_name, last_name, age, gender, password):
-    global user_id_counter
-    user = User(user_id_counter, email, first_name, last_name, age, gender)
-    user.set_password(password)
-    users_db[email] = user
-    user_id_counter += 1
-    return user
-
-def get_user_by_email(email):
-    return users_db.get(email)
-
-def get_user_by_id(user_id):
-    for user in users_db.values():
-        if user.id == user_id:
-            return user
-    return None
-
 class Consultation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -73,6 +55,67 @@ class Consultation(db.Model):
     payment_required = db.Column(db.Boolean, default=False)
     payment_status = db.Column(db.String(20), default='pending')  # pending, paid, free
     
+    # Dashboard and history list a user's consultations newest first
+    __table_args__ = (
+        db.Index('ix_consultation_user_id_created_at', 'user_id', 'created_at'),
+    )
+    
+    # Columns rendered by the dashboard and history lists; the analysis and
+    # additional_info blobs stay deferred until a single consultation is opened
+    LIST_COLUMNS = ('id', 'user_id', 'symptoms', 'severity', 'created_at', 'payment_required', 'payment_status')
+    
+    @classmethod
+    def page_for_user(cls, user_id, before=None, page_size=20):
+        """
+        Return one page of a user's consultations, newest first, and the
+        cursor for the next page (None on the last page).
+        
+        Uses keyset pagination on (created_at, id): ``before`` is the cursor
+        of the last row already shown, so every page is an index seek no
+        matter how deep into the history it is.
+        """
+        query = cls.query.options(load_only(*[getattr(cls, name) for name in cls.LIST_COLUMNS]))
+        query = query.filter(cls.user_id == user_id)
+        if before:
+            created_at, consultation_id = before
+            query = query.filter(or_(
+                cls.created_at < created_at,
+                and_(cls.created_at == created_at, cls.id < consultation_id)
+            ))
+        
+        consultations = query.order_by(cls.created_at.desc(), cls.id.desc()).limit(page_size + 1).all()
+        next_cursor = None
+        if len(consultations) > page_size:
+            consultations = consultations[:page_size]
+            next_cursor = (consultations[-1].created_at, consultations[-1].id)
+        return consultations, next_cursor
+    
+    @classmethod
+    def count_since(cls, user_id, since):
+        """Number of a user's consultations created at or after ``since`` (an index range count)"""
+        return db.session.query(db.func.count(cls.id)).filter(
+            cls.user_id == user_id, cls.created_at >= since
+        ).scalar()
+    
+    @staticmethod
+    def encode_cursor(cursor):
+        """Serialize a (created_at, id) cursor for use in a URL"""
+        if not cursor:
+            return None
+        created_at, consultation_id = cursor
+        return f"{created_at.isoformat()}_{consultation_id}"
+    
+    @staticmethod
+    def decode_cursor(value):
+        """Parse a URL cursor; returns None when missing or malformed"""
+        if not value:
+            return None
+        try:
+            created_at, consultation_id = value.rsplit('_', 1)
+            return datetime.fromisoformat(created_at), int(consultation_id)
+        except ValueError:
+            return None
+    
     def __repr__(self):
         return f'<Consultation {self.id} for User {self.user_id}>'
 
@@ -97,6 +140,12 @@ class Payment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
     
+    # Payment history is listed per user, newest first; transaction_id is
+    # already covered by the index behind its unique constraint
+    __table_args__ = (
+        db.Index('ix_payment_user_id_created_at', 'user_id', 'created_at'),
+    )
+    
     def __repr__(self):
         return f'<Payment {self.id} for User {self.user_id}>'
 
@@ -121,6 +170,18 @@ class ChatMessage(db.Model):
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Chat history is read per session in timestamp order
+    __table_args__ = (
+        db.Index('ix_chat_message_session_id_timestamp', 'session_id', 'timestamp'),
+    )
+    
+    @classmethod
+    def count_user_messages(cls, session_id):
+        """Number of stored user messages in a chat session"""
+        return db.session.query(db.func.count(cls.id)).filter(
+            cls.session_id == session_id, cls.message_type == 'user'
+        ).scalar()
+    
     def __repr__(self):
         return f'<ChatMessage {self.id} in Session {self.session_id}>'
 
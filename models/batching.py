@@ -0,0 +1,132 @@
+"""
+Dynamic micro-batching for model inference
+Gathers concurrent single-text requests into batches so the model runs one
+forward pass per batch instead of one per request.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional
+
+_STOP = object()
+
+
+class BatchingInferenceWorker:
+    """
+    Background worker that runs ``run_batch`` on batches of queued items.
+
+    A batch is closed when it holds ``max_batch_size`` items or when
+    ``max_wait_ms`` has passed since its first item arrived, whichever comes
+    first. ``run_batch`` receives a list of items and must return one result
+    per item, in the same order. If it raises, every caller in that batch
+    gets the exception.
+    """
+
+    def __init__(self, run_batch: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 16, max_wait_ms: float = 5.0,
+                 name: str = "batching-inference"):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    def start(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Batching worker is closed")
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue ``item`` for the next batch and return a Future for its result"""
+        if self._thread is None:
+            self.start()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def infer(self, item: Any, timeout: Optional[float] = None) -> Any:
+        """Submit ``item`` and block until its result is ready"""
+        return self.submit(item).result(timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        """Stop the worker after the already queued items have been served"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def _collect(self, first):
+        """Build a batch starting with ``first``; returns (batch, stop_requested)"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    entry = self._queue.get(timeout=remaining)
+                else:
+                    entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch, stop = self._collect(first)
+            self._serve(batch)
+            if stop:
+                return
+
+    def _serve(self, batch):
+        # Skip requests whose callers cancelled while waiting
+        batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+
+        try:
+            results = self.run_batch([item for item, _ in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"run_batch returned {len(results)} results for {len(batch)} items")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "batches": self.batches,
+            "requests": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "queued": self._queue.qsize(),
+        }
@@ -132,9 +132,10 @@ def test_model():
     print("\n🧪 Testing model...")
     
     try:
-        from huggingface_integration import analyze_symptoms_with_model, get_model_status
+        from huggingface_integration import analyze_symptoms_with_model, get_model_status, wait_for_model
         
         # Test the model
+        wait_for_model()
         test_symptoms = "I have a fever and headache"
         result = analyze_symptoms_with_model(test_symptoms)
         
@@ -0,0 +1,101 @@
+"""
+Export the medical text classifier for faster CPU inference
+Writes an ONNX graph (model.onnx) and a dynamically quantized int8 ONNX graph
+(model.int8.onnx) next to the PyTorch weights, for the "onnx" and
+"onnx-int8" backends of HuggingFaceModelManager. The "torch-int8" backend
+quantizes at load time and needs no export.
+"""
+
+import argparse
+import json
+import os
+from pathlib import Path
+
+try:
+    from huggingface_integration import ONNX_FILES
+except ImportError:
+    from .huggingface_integration import ONNX_FILES
+
+DEFAULT_MODEL_PATH = os.path.join("models", "medical_text_classifier")
+
+
+def export_onnx(model_path: Path, opset: int = 14) -> Path:
+    """Export the PyTorch classifier to ONNX with dynamic batch and sequence axes"""
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModelForSequenceClassification.from_pretrained(model_path)
+    model.eval()
+
+    sample = tokenizer(["I have a fever and headache"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+
+    onnx_path = model_path / ONNX_FILES["onnx"]
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            str(onnx_path),
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    print(f"✅ ONNX model written to {onnx_path}")
+    return onnx_path
+
+
+def quantize_onnx(onnx_path: Path) -> Path:
+    """Write a dynamically quantized (int8 weights) copy of an ONNX model"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    int8_path = onnx_path.with_name(ONNX_FILES["onnx-int8"])
+    quantize_dynamic(str(onnx_path), str(int8_path), weight_type=QuantType.QInt8)
+    print(f"✅ Quantized ONNX model written to {int8_path}")
+    return int8_path
+
+
+def record_exports(model_path: Path, exported):
+    """List the exported backends in model_config.json"""
+    config_path = model_path / "model_config.json"
+    config = {}
+    if config_path.exists():
+        with open(config_path) as f:
+            config = json.load(f)
+    config["exported_backends"] = sorted(set(config.get("exported_backends", [])) | set(exported))
+    with open(config_path, "w") as f:
+        json.dump(config, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the classifier to ONNX (fp32 and int8)")
+    parser.add_argument("--model-path", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--opset", type=int, default=14)
+    parser.add_argument("--skip-quantize", action="store_true", help="only write the fp32 ONNX graph")
+    args = parser.parse_args()
+
+    model_path = Path(args.model_path)
+    if not (model_path / "config.json").exists():
+        print(f"❌ No Hugging Face model found in {model_path}; run download_model.py first")
+        return 1
+
+    try:
+        onnx_path = export_onnx(model_path, args.opset)
+        exported = ["onnx"]
+        if not args.skip_quantize:
+            quantize_onnx(onnx_path)
+            exported.append("onnx-int8")
+    except ImportError as e:
+        print(f"❌ Missing dependency: {e.name}. Install torch, transformers, onnx and onnxruntime.")
+        return 1
+
+    record_exports(model_path, exported)
+    print("🔧 Select a backend with HF_BACKEND=onnx or HF_BACKEND=onnx-int8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
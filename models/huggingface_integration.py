@@ -5,9 +5,34 @@ This module provides a simple interface to use Hugging Face models for medical t
 
 import os
 import json
+import hashlib
+import threading
+import time
 from typing import Dict, List, Optional, Tuple
 import logging
 
+# torch, transformers and onnxruntime are imported by _load_model, so
+# importing this module stays cheap until the model is actually needed
+torch = None
+np = None
+
+# Inference backends: PyTorch fp32, PyTorch with dynamic int8 quantization of
+# the Linear layers, and ONNX Runtime sessions written by export_model.py
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+ONNX_FILES = {"onnx": "model.onnx", "onnx-int8": "model.int8.onnx"}
+
+# Sequence lengths a batch is padded up to; texts are grouped by the
+# smallest boundary that fits them, so short chat messages are not padded
+# to the length of the longest message in the batch
+DEFAULT_LENGTH_BUCKETS = (16, 32, 64, 128, 256, 512)
+
+try:
+    from .batching import BatchingInferenceWorker
+    from .inference_cache import InferenceCache
+except ImportError:
+    from batching import BatchingInferenceWorker
+    from inference_cache import InferenceCache
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,36 +43,219 @@ class HuggingFaceModelManager:
     Provides fallback functionality when models are not available.
     """
     
-    def __init__(self, model_path: str = "models/medical_model"):
+    # Stages reported while loading, with the progress reached once each is done
+    LOAD_STAGES = [
+        ("importing libraries", 0.3),
+        ("loading tokenizer", 0.4),
+        ("loading weights", 0.9),
+        ("starting inference worker", 1.0),
+    ]
+    
+    def __init__(self, model_path: str = "models/medical_model",
+                 max_batch_size: Optional[int] = None, max_wait_ms: Optional[float] = None,
+                 load: Optional[str] = None, backend: Optional[str] = None,
+                 max_length: Optional[int] = None, length_buckets: Optional[Tuple[int, ...]] = None):
         self.model_path = model_path
+        self.backend = backend or os.environ.get("HF_BACKEND", "torch")
+        if self.backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {self.backend!r}; expected one of {', '.join(BACKENDS)}")
         self.model_loaded = False
         self.model = None
         self.tokenizer = None
         
-        # Try to load the model
-        self._load_model()
+        # Concurrent requests are batched into one forward pass; a batch size
+        # of 1 disables batching and runs each request on its own thread
+        if max_batch_size is None:
+            max_batch_size = int(os.environ.get("HF_MAX_BATCH_SIZE", 16))
+        if max_wait_ms is None:
+            max_wait_ms = float(os.environ.get("HF_MAX_WAIT_MS", 5))
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        
+        # Chat messages rarely need 512 tokens; a lower HF_MAX_LENGTH (e.g.
+        # 128) truncates long inputs and caps the largest padded shape.
+        # HF_LENGTH_BUCKETS="" turns bucketing off (pad to the longest text).
+        if max_length is None:
+            max_length = int(os.environ.get("HF_MAX_LENGTH", 512))
+        if length_buckets is None:
+            env_buckets = os.environ.get("HF_LENGTH_BUCKETS")
+            if env_buckets is None:
+                length_buckets = DEFAULT_LENGTH_BUCKETS
+            else:
+                length_buckets = tuple(int(value) for value in env_buckets.split(",") if value.strip())
+        self.max_length = max_length
+        self.length_buckets = tuple(sorted({b for b in length_buckets if b < max_length} | {max_length})) \
+            if length_buckets else ()
+        self.batcher = None
+        self.model_version = None
+        
+        # Results of identical (after normalization) messages are reused;
+        # HF_CACHE_PATH shares them between worker processes via SQLite
+        cache_size = int(os.environ.get("HF_CACHE_SIZE", 1024))
+        self.cache = InferenceCache(
+            max_entries=cache_size,
+            ttl_seconds=float(os.environ.get("HF_CACHE_TTL", 3600)),
+            shared_path=os.environ.get("HF_CACHE_PATH") or None
+        ) if cache_size > 0 else None
+        
+        # "eager" loads in the constructor, "background" starts a loader
+        # thread right away and "lazy" starts it on the first analysis.
+        # Until the model is ready, requests get the keyword fallback.
+        self.load_mode = load or os.environ.get("HF_MODEL_LOAD", "lazy")
+        self.load_state = "not_started"
+        self.load_stage = None
+        self.load_progress = 0.0
+        self.load_error = None
+        self.load_started_at = None
+        self.load_time = None
+        self._load_lock = threading.Lock()
+        self._load_thread = None
+        self._load_done = threading.Event()
+        self._load_callbacks = []
+        
+        if self.load_mode == "eager":
+            self._load_model()
+        elif self.load_mode == "background":
+            self.start_loading()
+    
+    def start_loading(self):
+        """Start loading the model on a background thread (no-op if already started)"""
+        with self._load_lock:
+            if self.load_state != "not_started":
+                return
+            self.load_state = "loading"
+            self._load_thread = threading.Thread(target=self._load_model, name="hf-model-loader", daemon=True)
+            self._load_thread.start()
+    
+    def has_model_files(self) -> bool:
+        """True if there is a model directory to load; otherwise only the fallback can run"""
+        return os.path.isdir(self.model_path)
+    
+    def wait_until_loaded(self, timeout: Optional[float] = None) -> bool:
+        """Block until loading has finished (successfully or not)"""
+        self.start_loading()
+        return self._load_done.wait(timeout)
+    
+    def on_loaded(self, callback):
+        """Call ``callback()`` once loading has finished (right away if it already has)"""
+        with self._load_lock:
+            if not self._load_done.is_set():
+                self._load_callbacks.append(callback)
+                return
+        callback()
+    
+    def is_ready(self) -> bool:
+        """True once loading has finished, whether the model or the fallback serves requests"""
+        return self._load_done.is_set()
+    
+    def _set_stage(self, index: int):
+        self.load_stage = self.LOAD_STAGES[index][0]
+        if index:
+            self.load_progress = self.LOAD_STAGES[index - 1][1]
     
     def _load_model(self):
         """Attempt to load the Hugging Face model"""
+        self.load_state = "loading"
+        self.load_started_at = time.time()
+        start = time.perf_counter()
         try:
             # Check if transformers is available
+            self._set_stage(0)
             import transformers
-            from transformers import AutoTokenizer, AutoModelForSequenceClassification
+            from transformers import AutoTokenizer
             
             # Check if model directory exists
             if os.path.exists(self.model_path):
-                logger.info(f"Loading model from {self.model_path}")
-                self.tokenizer = AutoTokenizer.from_pretrained(self.model_path)
-                self.model = AutoModelForSequenceClassification.from_pretrained(self.model_path)
+                logger.info(f"Loading model from {self.model_path} ({self.backend})")
+                self._set_stage(1)
+                tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+                self._set_stage(2)
+                if self.backend.startswith("onnx"):
+                    model = self._load_onnx_session()
+                else:
+                    model = self._load_torch_model()
+                
+                self._set_stage(3)
+                self.tokenizer = tokenizer
+                self.model = model
+                self.model_version = self._model_version()
+                self._start_batcher()
+                # Published last: requests switch from the fallback only
+                # once everything they need is in place
                 self.model_loaded = True
+                self.load_state = "ready"
+                self.load_progress = 1.0
                 logger.info("Model loaded successfully")
             else:
+                self.load_state = "unavailable"
                 logger.warning(f"Model directory {self.model_path} not found. Using fallback mode.")
                 
-        except ImportError:
-            logger.warning("Transformers library not available. Using fallback mode.")
+        except ImportError as e:
+            self.load_state = "unavailable"
+            logger.warning(f"Model libraries not available ({e.name}). Using fallback mode.")
         except Exception as e:
+            self.load_state = "failed"
+            self.load_error = str(e)
             logger.error(f"Error loading model: {e}. Using fallback mode.")
+        finally:
+            self.load_time = time.perf_counter() - start
+            self.load_stage = None
+            self._load_done.set()
+            with self._load_lock:
+                callbacks, self._load_callbacks = self._load_callbacks, []
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"Error in model load callback: {e}")
+    
+    def _load_torch_model(self):
+        global torch
+        import torch
+        from transformers import AutoModelForSequenceClassification
+        
+        model = AutoModelForSequenceClassification.from_pretrained(self.model_path)
+        model.eval()
+        if self.backend == "torch-int8":
+            # Weights of the Linear layers stored as int8, activations
+            # quantized on the fly; no calibration data needed
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model
+    
+    def _load_onnx_session(self):
+        global np
+        import numpy as np
+        import onnxruntime
+        
+        onnx_path = os.path.join(self.model_path, ONNX_FILES[self.backend])
+        if not os.path.exists(onnx_path):
+            raise FileNotFoundError(f"{onnx_path} not found; run export_model.py first")
+        return onnxruntime.InferenceSession(onnx_path, providers=["CPUExecutionProvider"])
+    
+    def _model_version(self) -> str:
+        """Backend plus a fingerprint of the model files, so cached results
+        from other weights or backends are never reused"""
+        digest = hashlib.sha1()
+        for name in sorted(os.listdir(self.model_path)):
+            path = os.path.join(self.model_path, name)
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+        return f"{self.backend}:{self.max_length}:{digest.hexdigest()[:12]}"
+    
+    def after_fork(self):
+        """Reset per-process state in a forked worker (see analysis_pool.py)"""
+        # The batching thread does not exist in the child; a worker process
+        # serves one request at a time, so it runs the model directly
+        self.batcher = None
+    
+    def _start_batcher(self):
+        if self.max_batch_size > 1:
+            self.batcher = BatchingInferenceWorker(
+                self._analyze_batch_with_model,
+                max_batch_size=self.max_batch_size,
+                max_wait_ms=self.max_wait_ms
+            )
     
     def analyze_symptoms(self, symptoms_text: str) -> Dict[str, any]:
         """
@@ -59,45 +267,126 @@ class HuggingFaceModelManager:
         Returns:
             Dict containing analysis results
         """
+        if self.load_state == "not_started":
+            self.start_loading()
+        
         if self.model_loaded and self.model and self.tokenizer:
-            return self._analyze_with_model(symptoms_text)
+            if self.cache is None:
+                return self._run_model(symptoms_text)
+            
+            key = self.cache.make_key(symptoms_text, self.model_version)
+            result = self.cache.get(key)
+            if result is None:
+                result = self._run_model(symptoms_text)
+                # Fallback answers given after a model error are not cached
+                if result.get("model_used"):
+                    self.cache.put(key, result)
+            return result
         else:
             return self._fallback_analysis(symptoms_text)
     
+    def _run_model(self, symptoms_text: str) -> Dict[str, any]:
+        if self.batcher is not None:
+            try:
+                return self.batcher.infer(symptoms_text)
+            except Exception as e:
+                logger.error(f"Error in model analysis: {e}")
+                return self._fallback_analysis(symptoms_text)
+        return self._analyze_with_model(symptoms_text)
+    
     def _analyze_with_model(self, symptoms_text: str) -> Dict[str, any]:
         """Analyze symptoms using the loaded Hugging Face model"""
         try:
-            # Tokenize input
-            inputs = self.tokenizer(
-                symptoms_text, 
-                return_tensors="pt", 
-                truncation=True, 
-                max_length=512,
-                padding=True
-            )
-            
-            # Get model predictions
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                predictions = torch.softmax(outputs.logits, dim=-1)
-            
-            # Convert to probabilities
-            probs = predictions[0].tolist()
-            
-            # Get predicted class
-            predicted_class = torch.argmax(predictions, dim=-1).item()
-            
-            return {
+            return self._analyze_batch_with_model([symptoms_text])[0]
+        except Exception as e:
+            logger.error(f"Error in model analysis: {e}")
+            return self._fallback_analysis(symptoms_text)
+    
+    def _analyze_batch_with_model(self, texts: List[str]) -> List[Dict[str, any]]:
+        """Run ``texts`` through the model, one forward pass per length bucket"""
+        batch_probs = [None] * len(texts)
+        for indices, inputs in self._bucketed_inputs(texts):
+            for index, probs in zip(indices, self._predict(inputs)):
+                batch_probs[index] = probs
+        
+        results = []
+        for probs in batch_probs:
+            predicted_class = probs.index(max(probs))
+            results.append({
                 "model_used": True,
                 "confidence": max(probs),
                 "predicted_class": predicted_class,
                 "probabilities": probs,
                 "analysis": f"Model analysis: Class {predicted_class} with {max(probs):.2%} confidence"
-            }
-            
-        except Exception as e:
-            logger.error(f"Error in model analysis: {e}")
-            return self._fallback_analysis(symptoms_text)
+            })
+        return results
+    
+    def _bucket_for(self, length: int) -> Optional[int]:
+        for boundary in self.length_buckets:
+            if length <= boundary:
+                return boundary
+        return None
+    
+    def _bucketed_inputs(self, texts: List[str]):
+        """
+        Yield ``(indices, padded_inputs)`` groups covering every text
+        
+        Texts are tokenized once without padding, sorted by token count and
+        grouped by length bucket; each group is padded to its bucket
+        boundary. The attention mask keeps the padded positions from
+        affecting the results.
+        """
+        tensor_type = "np" if self.backend.startswith("onnx") else "pt"
+        encoded = self.tokenizer(texts, truncation=True, max_length=self.max_length)
+        lengths = [len(ids) for ids in encoded["input_ids"]]
+        
+        if not self.length_buckets:
+            groups = [(list(range(len(texts))), None)]
+        else:
+            groups = []
+            for index in sorted(range(len(texts)), key=lengths.__getitem__):
+                bucket = self._bucket_for(lengths[index])
+                if not groups or groups[-1][1] != bucket:
+                    groups.append(([], bucket))
+                groups[-1][0].append(index)
+        
+        for indices, bucket in groups:
+            features = [{key: encoded[key][index] for key in encoded.keys()} for index in indices]
+            inputs = self.tokenizer.pad(
+                features,
+                padding="max_length" if bucket else "longest",
+                max_length=bucket,
+                return_tensors=tensor_type
+            )
+            yield indices, inputs
+    
+    def _predict(self, inputs) -> List[List[float]]:
+        if self.backend.startswith("onnx"):
+            return self._predict_onnx(inputs)
+        return self._predict_torch(inputs)
+    
+    def _predict_torch(self, inputs) -> List[List[float]]:
+        # Get model predictions
+        with torch.no_grad():
+            outputs = self.model(**inputs)
+            predictions = torch.softmax(outputs.logits, dim=-1)
+        return predictions.tolist()
+    
+    def _predict_onnx(self, inputs) -> List[List[float]]:
+        # Feed only the inputs the exported graph declares (DistilBERT has
+        # no token_type_ids)
+        feed = {
+            node.name: inputs[node.name].astype(np.int64)
+            for node in self.model.get_inputs()
+        }
+        logits = self.model.run(None, feed)[0]
+        logits = logits - logits.max(axis=-1, keepdims=True)
+        exp = np.exp(logits)
+        return (exp / exp.sum(axis=-1, keepdims=True)).tolist()
+    
+    def keyword_analysis(self, symptoms_text: str) -> Dict[str, any]:
+        """Keyword-only analysis, without the model (e.g. when the analysis pool is busy)"""
+        return self._fallback_analysis(symptoms_text)
     
     def _fallback_analysis(self, symptoms_text: str) -> Dict[str, any]:
         """Fallback analysis when model is not available"""
@@ -156,8 +445,21 @@ class HuggingFaceModelManager:
         """Get information about the loaded model"""
         return {
             "model_loaded": self.model_loaded,
+            "load_mode": self.load_mode,
+            "load_state": self.load_state,
+            "load_stage": self.load_stage,
+            "load_progress": round(self.load_progress, 2),
+            "load_time_seconds": round(self.load_time, 3) if self.load_time is not None else None,
+            "load_error": self.load_error,
+            "ready": self.is_ready(),
+            "batching": self.batcher.get_stats() if self.batcher else None,
             "model_path": self.model_path,
-            "model_type": "Hugging Face Transformers" if self.model_loaded else "Fallback Mode",
+            "backend": self.backend,
+            "model_version": self.model_version,
+            "max_length": self.max_length,
+            "length_buckets": list(self.length_buckets),
+            "cache": self.cache.get_stats() if self.cache else None,
+            "model_type": f"Hugging Face Transformers ({self.backend})" if self.model_loaded else "Fallback Mode",
             "capabilities": [
                 "Symptom analysis",
                 "Condition prediction",
@@ -169,7 +471,8 @@ class HuggingFaceModelManager:
             ]
         }
 
-# Global model manager instance
+# Global model manager instance; the model itself is loaded on first use
+# (or right away with HF_MODEL_LOAD=background / eager)
 model_manager = HuggingFaceModelManager()
 
 def analyze_symptoms_with_model(symptoms_text: str) -> Dict[str, any]:
@@ -193,8 +496,21 @@ def get_model_status() -> Dict[str, any]:
     """
     return model_manager.get_model_info()
 
+def wait_for_model(timeout: Optional[float] = None) -> bool:
+    """
+    Start loading the model if needed and wait for loading to finish
+    
+    Args:
+        timeout (float): Seconds to wait, or None to wait indefinitely
+        
+    Returns:
+        True if loading finished (model loaded or fallback mode), False on timeout
+    """
+    return model_manager.wait_until_loaded(timeout)
+
 if __name__ == "__main__":
     # Test the model manager
+    wait_for_model()
     test_symptoms = "I have a fever and headache, feeling very tired"
     result = analyze_symptoms_with_model(test_symptoms)
     print("Model Status:", get_model_status())
@@ -0,0 +1,179 @@
+"""
+Result cache for model inference
+A bounded in-process LRU with a TTL, optionally backed by a SQLite file so
+several worker processes (e.g. gunicorn workers) share their results.
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Case- and whitespace-insensitive form of a message, used as the cache key"""
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+class SharedResultStore:
+    """
+    Cross-process result store in a SQLite file (WAL mode).
+
+    Each process and thread opens its own connection, so the store is safe
+    to use after a fork. Failures are logged and treated as misses.
+    """
+
+    PRUNE_EVERY = 256
+
+    def __init__(self, path: str, max_entries: int = 100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS inference_cache "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        try:
+            row = self._connect().execute(
+                "SELECT value FROM inference_cache WHERE key = ? AND expires > ?", (key, now)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Shared inference cache read failed: {e}")
+            return None
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, value: Dict[str, Any], expires: float):
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO inference_cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value), expires)
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self.prune(time.time())
+        except sqlite3.Error as e:
+            logger.warning(f"Shared inference cache write failed: {e}")
+
+    def prune(self, now: float):
+        """Drop expired rows, then the soonest-expiring rows beyond max_entries"""
+        conn = self._connect()
+        conn.execute("DELETE FROM inference_cache WHERE expires <= ?", (now,))
+        conn.execute(
+            "DELETE FROM inference_cache WHERE key IN ("
+            "SELECT key FROM inference_cache ORDER BY expires "
+            "LIMIT max(0, (SELECT COUNT(*) FROM inference_cache) - ?))",
+            (self.max_entries,)
+        )
+
+
+class InferenceCache:
+    """
+    LRU cache of analysis results keyed on normalized text and model version.
+
+    Entries expire ``ttl_seconds`` after they were stored. With
+    ``shared_path`` a local miss falls through to a SQLite store shared by
+    every process using the same file, and new results are written to both.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600,
+                 shared_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.shared = SharedResultStore(shared_path) if shared_path else None
+
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def make_key(text: str, model_version: str) -> str:
+        return f"{model_version}\x1f{normalize_text(text)}"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(value)
+                del self._entries[key]
+                self.expirations += 1
+
+        if self.shared is not None:
+            value = self.shared.get(key, now)
+            if value is not None:
+                with self._lock:
+                    self.shared_hits += 1
+                    self._store(key, json.dumps(value), now + self.ttl_seconds)
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        expires = time.time() + self.ttl_seconds
+        # Stored serialized so callers never share (and mutate) cached objects
+        encoded = json.dumps(value)
+        with self._lock:
+            self._store(key, encoded, expires)
+        if self.shared is not None:
+            self.shared.put(key, value, expires)
+
+    def _store(self, key: str, encoded: str, expires: float):
+        self._entries[key] = (expires, encoded)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "shared_path": self.shared.path if self.shared else None,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round((self.hits + self.shared_hits) / lookups, 3) if lookups else 0.0,
+        }
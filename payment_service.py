@@ -1,8 +1,67 @@
 import os
+import threading
 import uuid
 from datetime import datetime, timedelta
-from typing import Dict, Optional
+from types import MappingProxyType
+from typing import Dict, Mapping, Optional
 from models import Payment, User, Consultation, PricingPlan
+from db_routing import use_replica
+
+
+_UNLOADED = object()
+
+
+class EntitlementCache:
+    """
+    Bounded cache of per-user entitlement snapshots.
+
+    An entry is only reused while the user's quota and subscription columns
+    still match the ones it was computed from and its natural expiry (the
+    end of the subscription it relies on) has not passed, so usage recorded
+    elsewhere is picked up on the next lookup. Payments and refunds also
+    drop the entry explicitly. Lookups take no lock (a dict read is atomic);
+    the oldest entries are evicted first once ``max_users`` is reached.
+    """
+
+    def __init__(self, max_users: int = 10000):
+        self.max_users = max_users
+        self._entries: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user: User) -> Optional[Mapping]:
+        # Loaded column values live in the instance __dict__; reading them
+        # there skips SQLAlchemy's attribute machinery, and an expired
+        # (unloaded) column simply counts as a miss
+        loaded = user.__dict__
+        entry = self._entries.get(loaded.get('id'))
+        if entry is not None:
+            used, status, expires, snapshot = entry
+            if loaded.get('free_consultations_used', _UNLOADED) == used \
+                    and loaded.get('subscription_status', _UNLOADED) == status \
+                    and loaded.get('subscription_expires', _UNLOADED) == expires \
+                    and (snapshot['expires_at'] is None or datetime.utcnow() < snapshot['expires_at']):
+                self.hits += 1
+                return snapshot
+        self.misses += 1
+        return None
+
+    def put(self, user: User, snapshot: Mapping):
+        entry = (user.free_consultations_used, user.subscription_status, user.subscription_expires, snapshot)
+        with self._lock:
+            self._entries.pop(user.id, None)
+            self._entries[user.id] = entry
+            while len(self._entries) > self.max_users:
+                del self._entries[next(iter(self._entries))]
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def get_stats(self) -> Dict:
+        return {'users': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
 
 class PaymentService:
     def __init__(self):
@@ -19,6 +78,8 @@ class PaymentService:
             self.enabled = False
         
         self.currency = 'usd'
+        self.consultation_price = 9.99
+        self.entitlements = EntitlementCache()
         
         # Default pricing plans
         self.default_plans = {
@@ -127,6 +188,7 @@ class PaymentService:
                 
                 user.subscription_status = 'premium'
                 user.subscription_expires = datetime.utcnow() + timedelta(days=plan['duration_days'])
+            self.entitlements.invalidate(payment.user_id)
             
             return {
                 'success': True,
@@ -144,31 +206,44 @@ class PaymentService:
         """
         return self.default_plans
     
-    def calculate_consultation_cost(self, user: User) -> Dict:
+    def calculate_consultation_cost(self, user: User) -> Mapping:
         """
         Calculate cost for consultation based on user's current status
         """
-        if user.can_use_free_consultation():
-            return {
-                'cost': 0.0,
-                'currency': 'USD',
-                'payment_required': False,
-                'message': 'Free consultation available'
-            }
-        elif user.has_active_subscription():
-            return {
-                'cost': 0.0,
-                'currency': 'USD',
-                'payment_required': False,
-                'message': 'Covered by active subscription'
-            }
+        return self.get_entitlements(user)
+    
+    def get_entitlements(self, user: User) -> Mapping:
+        """
+        Read-only snapshot of what the user may do: free consultations left,
+        subscription expiry and the cost of the next consultation (with the
+        cost, currency, payment_required and message keys callers expect).
+        Shared between requests until the user's state changes or it expires.
+        """
+        snapshot = self.entitlements.get(user)
+        if snapshot is None:
+            snapshot = self._build_entitlements(user)
+            self.entitlements.put(user, snapshot)
+        return snapshot
+    
+    def _build_entitlements(self, user: User) -> Mapping:
+        free_left = max(User.FREE_CONSULTATIONS - (user.free_consultations_used or 0), 0)
+        subscribed = bool(user.has_active_subscription())
+        if free_left:
+            cost, message = 0.0, 'Free consultation available'
+        elif subscribed:
+            cost, message = 0.0, 'Covered by active subscription'
         else:
-            return {
-                'cost': 9.99,
-                'currency': 'USD',
-                'payment_required': True,
-                'message': 'Payment required for consultation'
-            }
+            cost, message = self.consultation_price, 'Payment required for consultation'
+        return MappingProxyType({
+            'cost': cost,
+            'currency': 'USD',
+            'payment_required': cost > 0,
+            'message': message,
+            'free_consultations_left': free_left,
+            'subscription_expires': user.subscription_expires if subscribed else None,
+            # The answer can only change by itself when the subscription ends
+            'expires_at': user.subscription_expires if subscribed else None,
+        })
     
     def create_subscription_payment(self, user_id: int, plan_name: str) -> Dict:
         """
@@ -209,6 +284,7 @@ class PaymentService:
             
             # Update payment status
             payment.status = 'refunded'
+            self.entitlements.invalidate(payment.user_id)
             
             return {
                 'success': True,
@@ -223,7 +299,8 @@ class PaymentService:
         """
         Get payment history for user
         """
-        payments = Payment.query.filter_by(user_id=user_id).order_by(Payment.created_at.desc()).all()
+        with use_replica():
+            payments = Payment.query.filter_by(user_id=user_id).order_by(Payment.created_at.desc()).all()
         return [
             {
                 'id': p.id,
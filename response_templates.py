@@ -0,0 +1,170 @@
+from itertools import chain, islice
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Numeric severity ranks. They order the known severities the same way the
+# old string comparison did (mild < moderate < severe); anything else ranks
+# lowest.
+SEVERITY_RANKS = {"mild": 1, "moderate": 2, "severe": 3}
+
+DISCLAIMER = (
+    "\n\nWould you like me to explain the dosage or any side effects?\n\n"
+    "**Important:** This is for informational purposes only and should not replace professional "
+    "medical advice. If symptoms persist or worsen, please consult with a healthcare provider."
+)
+
+
+class DiagnosisTemplates:
+    """
+    Pre-rendered diagnosis replies for app.AIDoctor
+
+    Built once from the symptom database: each symptom's diagnosis, its
+    numeric severity rank, its display name and the tail of the reply that
+    names the disease and prescription. A reply is then the most severe
+    symptom's tail plus the joined symptom names.
+    """
+
+    GENERAL_DIAGNOSIS = {
+        'disease': 'General Consultation Needed',
+        'prescription': 'Please provide more specific symptoms or consult a healthcare provider.',
+        'severity': 'unknown',
+    }
+
+    def __init__(self, symptom_database: Dict[str, Dict]):
+        self.diagnoses = {}
+        self.ranks = {}
+        self.display_names = {}
+        self.tails = {}
+        for key, info in symptom_database.items():
+            self.diagnoses[key] = {
+                'disease': info['diseases'][0],
+                'prescription': info['prescription'],
+                'severity': info['severity'],
+            }
+            self.ranks[key] = SEVERITY_RANKS.get(info['severity'], 0)
+            self.display_names[key] = key.replace('_', ' ')
+            self.tails[key] = self._tail(self.diagnoses[key])
+        self.general_reply = ("I can see you're not feeling well. Based on what you've described, "
+                              + self._tail(self.GENERAL_DIAGNOSIS))
+
+    @staticmethod
+    def _tail(diagnosis: Dict) -> str:
+        return (f"you may be experiencing **{diagnosis['disease']}**.\n\n"
+                f"**My Prescription:**\n{diagnosis['prescription']}" + DISCLAIMER)
+
+    def most_severe(self, matched_symptoms: Sequence[str]) -> str:
+        """First of the highest-ranked symptoms"""
+        if len(matched_symptoms) == 1:
+            return matched_symptoms[0]
+        return max(matched_symptoms, key=self.ranks.__getitem__)
+
+    def diagnosis(self, matched_symptoms: List[str]) -> Dict:
+        if not matched_symptoms:
+            return dict(self.GENERAL_DIAGNOSIS, matched_symptoms=[])
+        return dict(self.diagnoses[self.most_severe(matched_symptoms)], matched_symptoms=matched_symptoms)
+
+    def render(self, matched_symptoms: List[str]) -> Tuple[Dict, str]:
+        """Diagnosis of the most severe matched symptom and the reply naming all of them"""
+        most_severe = self.most_severe(matched_symptoms)
+        diagnosis = dict(self.diagnoses[most_severe], matched_symptoms=matched_symptoms)
+        names = ', '.join([self.display_names[key] for key in matched_symptoms])
+        return diagnosis, f"I understand you're experiencing {names}. Based on your symptoms, {self.tails[most_severe]}"
+
+    def general(self) -> Tuple[Dict, str]:
+        """General diagnosis and reply when no known symptom matched"""
+        return self.diagnosis([]), self.general_reply
+
+
+class ConsultationTemplates:
+    """
+    Pre-rendered symptom analysis and prescription replies for ai_doctor.AIDoctor
+
+    A reply only uses the first two conditions, the first three medications
+    and the first two advice lines, collected in symptom order. These nearly
+    always come from the first two known symptoms, so replies are built
+    ahead of time for every single symptom and every ordered pair. Symptom
+    combinations with a reply of their own (e.g. chest pain with difficulty
+    breathing) are checked first. Lists for which the first two symptoms do
+    not supply enough items are assembled on the fly as before.
+    """
+
+    def __init__(self, medical_knowledge: Dict[str, Dict], combinations: Optional[Iterable] = None):
+        self.fragments = {
+            symptom: (tuple(info['conditions'][:2]), tuple(info['medications'][:2]), info['advice'])
+            for symptom, info in medical_knowledge.items()
+        }
+        # (required symptoms, reply) pairs, checked in order
+        self.combinations = [
+            (tuple(combination['symptoms']), self._freeze(combination['reply'])) for combination in (combinations or [])
+        ]
+
+        self.analyses = {}
+        self.prescriptions = {}
+        self.complete = {}
+        keys = [()] + [(symptom,) for symptom in self.fragments]
+        keys += [(first, second) for first in self.fragments for second in self.fragments if first != second]
+        for key in keys:
+            self.analyses[key] = self._freeze(self._assemble_analysis(key))
+            self.prescriptions[key] = self._freeze(self._assemble_prescription(key))
+            conditions, medications, _ = self._collect(key)
+            self.complete[key] = len(conditions) >= 2 and len(medications) >= 3
+
+    def _collect(self, known: Sequence[str]):
+        fragments = [self.fragments[symptom] for symptom in known]
+        conditions = list(islice(chain.from_iterable(f[0] for f in fragments), 2))
+        medications = list(islice(chain.from_iterable(f[1] for f in fragments), 3))
+        advice = [f[2] for f in fragments[:2]]
+        return conditions, medications, advice
+
+    def _assemble_analysis(self, known: Sequence[str]) -> Dict:
+        conditions, medications, advice = self._collect(known)
+        response = (
+            f"Based on your symptoms, you appear to have {', '.join(conditions[:2])}. "
+            f"As your doctor, I recommend {advice[0] if advice else 'rest and monitoring'}. "
+            f"You can take {', '.join(medications[:2])} to help manage your symptoms. "
+            f"Let me know if your symptoms worsen or persist beyond a few days."
+        )
+        return {"response": response, "medications": medications, "advice": advice, "requires_follow_up": True}
+
+    def _assemble_prescription(self, known: Sequence[str]) -> Dict:
+        conditions, medications, advice = self._collect(known)
+        if not conditions:
+            conditions = ["General health concern"]
+            advice = ["Rest and monitor symptoms"]
+        response = (
+            f"Based on your symptoms, here's your prescription: {', '.join(medications)}. "
+            f"Take as directed for {', '.join(conditions)}. "
+            f"{advice[0] if advice else 'Rest and monitor your symptoms'}. "
+            f"Follow up with me if symptoms persist or worsen."
+        )
+        return {"response": response, "medications": medications, "advice": advice, "requires_follow_up": False}
+
+    @staticmethod
+    def _freeze(reply: Dict) -> Tuple:
+        return reply["response"], tuple(reply["medications"]), tuple(reply["advice"]), reply["requires_follow_up"]
+
+    @staticmethod
+    def _thaw(reply: Tuple) -> Dict:
+        """A fresh reply dict, so callers can modify it"""
+        response, medications, advice, requires_follow_up = reply
+        return {"response": response, "medications": list(medications), "advice": list(advice),
+                "requires_follow_up": requires_follow_up}
+
+    def _lookup(self, table: Dict, symptoms: Sequence[str], assemble) -> Dict:
+        known = [symptom for symptom in symptoms if symptom in self.fragments]
+        key = tuple(known[:2])
+        reply = table.get(key)
+        if reply is None or (len(known) > 2 and not self.complete[key]):
+            return assemble(known)
+        return self._thaw(reply)
+
+    def symptom_analysis(self, symptoms: Sequence[str]) -> Dict:
+        for required, reply in self.combinations:
+            for symptom in required:
+                if symptom not in symptoms:
+                    break
+            else:
+                return self._thaw(reply)
+        return self._lookup(self.analyses, symptoms, self._assemble_analysis)
+
+    def prescription(self, symptoms: Sequence[str]) -> Dict:
+        return self._lookup(self.prescriptions, symptoms, self._assemble_prescription)
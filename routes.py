@@ -2,23 +2,28 @@ import os
 import uuid
 import json
 from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from . import db
 from .models import User, Consultation, Symptom, ChatSession, ChatMessage
 from .forms import LoginForm, RegistrationForm, SymptomForm
-from .symptom_analyzer import SymptomAnalyzer
 
 # Import services
-from ai_doctor import AIDoctor
-from payment_service import PaymentService
+from engine_registry import get_engine, registry
+from chat_context import ChatContextCache
+from analysis_pool import analyze_with_model, get_analysis_pool, model_analysis_fields
+from chat_writer import ChatWriter
+from db_routing import read_replica
+from sse import StreamError, sse_response, stream_reply
 
-# Initialize services
+# Services come from the process-wide engine registry, so this module and
+# app.py share one instance of each (built before the workers fork when the
+# app is preloaded)
 def get_ai_doctor():
     """Get AI doctor instance with error handling"""
     try:
-        return AIDoctor()
+        return get_engine('doctor')
     except Exception as e:
         print(f"Error creating AI doctor: {e}")
         return None
@@ -26,7 +31,7 @@ def get_ai_doctor():
 def get_payment_service():
     """Get payment service instance with error handling"""
     try:
-        return PaymentService()
+        return get_engine('payment_service')
     except Exception as e:
         print(f"Error creating payment service: {e}")
         return None
@@ -42,19 +47,63 @@ def get_safe_ai_doctor():
     """Safely get AI doctor instance, recreating if necessary"""
     global ai_doctor, _ai_doctor_available
     
-    if ai_doctor is None or not hasattr(ai_doctor, 'get_medical_response'):
-        try:
-            ai_doctor = get_ai_doctor()
-            _ai_doctor_available = ai_doctor is not None
-        except Exception as e:
-            print(f"Error recreating AI doctor: {e}")
-            ai_doctor = None
-            _ai_doctor_available = False
-    
+    # The registry retries a failed construction and swaps in a rebuilt
+    # doctor after data/knowledge_base.json changes
+    ai_doctor = get_ai_doctor()
+    _ai_doctor_available = ai_doctor is not None
     return ai_doctor
 
-# Initialize symptom analyzer
-symptom_analyzer = SymptomAnalyzer()
+def get_symptom_analyzer():
+    """Symptom analyzer for the current knowledge base"""
+    return get_engine('symptom_analyzer')
+
+# Per-session conversation context (recent user text + detected symptoms),
+# so a chat turn does not reload and re-scan the whole conversation. Each
+# process has its own cache; a hit is checked against the stored turn count
+# so turns handled by other workers are picked up (see get_conversation_context)
+chat_contexts = ChatContextCache(
+    max_sessions=int(os.environ.get('CHAT_CONTEXT_CACHE_SIZE', 10000)),
+    window=int(os.environ.get('CHAT_CONTEXT_WINDOW', 10))
+)
+
+# Chat turns are persisted write-behind: grouped into one transaction every
+# CHAT_WRITE_INTERVAL_MS or CHAT_WRITE_BATCH_ROWS rows. CHAT_WRITE_DURABLE=1
+# makes each request wait for its batch's commit, so a history read served
+# by another worker sees the turn
+chat_writer = ChatWriter(
+    ChatMessage.__table__, ChatSession.__table__,
+    interval_ms=float(os.environ.get('CHAT_WRITE_INTERVAL_MS', 20)),
+    max_rows=int(os.environ.get('CHAT_WRITE_BATCH_ROWS', 500)),
+    enabled=os.environ.get('CHAT_WRITE_BEHIND', '1') != '0',
+    durable=os.environ.get('CHAT_WRITE_DURABLE', '0') != '0'
+)
+
+def get_chat_writer():
+    """The chat writer, bound to this app's database"""
+    chat_writer.start(db.engine)
+    return chat_writer
+
+def get_conversation_context(session_id, doctor):
+    """
+    Return the cached context for a chat session, rebuilding it from the DB
+    on a miss or when the session has turns the context has not seen
+    (handled by another worker process)
+    """
+    writer = get_chat_writer()
+    # This process's turns still queued for writing count as stored
+    stored = ChatMessage.count_user_messages(session_id) + writer.pending_turns(session_id)
+    context = chat_contexts.get(session_id, user_message_count=stored)
+    if context is not None:
+        return context
+    
+    context = chat_contexts.new(session_id)
+    writer.flush()  # include turns still queued for writing
+    user_messages = ChatMessage.query.with_entities(ChatMessage.content).filter_by(
+        session_id=session_id, message_type='user'
+    ).order_by(ChatMessage.timestamp).all()
+    for (content,) in user_messages:
+        context.add_user_message(content, doctor._detect_symptoms(content))
+    return context
 
 @app.route('/')
 def index():
@@ -118,9 +167,16 @@ def logout():
 
 @app.route('/dashboard')
 @login_required
+@read_replica
 def dashboard():
-    # Get user's consultations
-    consultations = Consultation.query.filter_by(user_id=current_user.id).order_by(Consultation.created_at.desc()).all()
+    # Get the user's most recent consultations (first page only)
+    consultations, _ = Consultation.page_for_user(
+        current_user.id,
+        page_size=current_app.config.get('CONSULTATIONS_PAGE_SIZE', 20)
+    )
+    # Counted separately: the list above is capped at one page
+    month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    monthly_consultations = Consultation.count_since(current_user.id, month_start)
     
     # Calculate payment info if payment service is available
     payment_info = None
@@ -129,6 +185,7 @@ def dashboard():
     
     return render_template('dashboard.html', 
                          recent_consultations=consultations, 
+                         monthly_consultations=monthly_consultations,
                          payment_info=payment_info)
 
 @app.route('/symptoms', methods=['GET', 'POST'])
@@ -197,7 +254,7 @@ def symptoms():
         db.session.commit()
         
         # Analyze symptoms - pass the symptoms list to the analyzer
-        analysis = symptom_analyzer.analyze_symptoms(symptoms_list, current_user.age, current_user.gender, form.severity.data)
+        analysis = get_symptom_analyzer().analyze_symptoms(symptoms_list, current_user.age, current_user.gender, form.severity.data)
         consultation.analysis = json.dumps(analysis)  # Convert dictionary to JSON string
         db.session.commit()
         
@@ -246,10 +303,17 @@ def results(consultation_id):
 
 @app.route('/history')
 @login_required
+@read_replica
 def history_list():
-    # Get all consultations for the current user
-    consultations = Consultation.query.filter_by(user_id=current_user.id).order_by(Consultation.created_at.desc()).all()
-    return render_template('history_list.html', consultations=consultations)
+    # Get one page of consultations for the current user
+    consultations, next_cursor = Consultation.page_for_user(
+        current_user.id,
+        before=Consultation.decode_cursor(request.args.get('before')),
+        page_size=current_app.config.get('CONSULTATIONS_PAGE_SIZE', 20)
+    )
+    return render_template('history_list.html',
+                         consultations=consultations,
+                         next_cursor=Consultation.encode_cursor(next_cursor))
 
 @app.route('/history/<int:consultation_id>')
 @login_required
@@ -311,76 +375,106 @@ def start_chat():
     db.session.add(welcome_message)
     db.session.commit()
     
+    chat_contexts.new(session_id)
+    
     return jsonify({'success': True, 'session_id': session_id})
 
-@app.route('/ai-doctor/send-message', methods=['POST'])
-@login_required
-def send_message():
+def read_chat_turn():
+    """The posted message and chat session id; returns (message, session_id, error)"""
     data = request.get_json()
     message = data.get('message', '').strip()
     session_id = data.get('session_id')
     
     if not message or not session_id:
-        return jsonify({'success': False, 'message': 'Invalid request'})
-    
-    # Save user message
-    user_message = ChatMessage(
-        session_id=session_id,
-        message_type='user',
-        content=message
-    )
-    db.session.add(user_message)
-    
-    # Get chat history
-    chat_history = ChatMessage.query.filter_by(session_id=session_id).order_by(ChatMessage.timestamp).all()
-    history_data = [
-        {'type': msg.message_type, 'content': msg.content}
-        for msg in chat_history
-    ]
-    
+        return None, None, ({'success': False, 'message': 'Invalid request'}, 200)
+    return message, session_id, None
+
+def answer_chat_turn(message, session_id):
+    """Run and persist one chat turn; returns (ai_response, error) with error as (body, status)"""
     # Get AI response with error handling
     safe_ai_doctor = get_safe_ai_doctor()
     
     if not safe_ai_doctor:
-        return jsonify({
+        return None, ({
             'success': False,
             'error': 'AI doctor service is temporarily unavailable. Please try again.'
-        }), 500
+        }, 500)
+    
+    # Conversation context is cached per session; the DB is only read on a miss
+    context = get_conversation_context(session_id, safe_ai_doctor)
+    
+    received_at = datetime.utcnow()
     
     try:
-        ai_response = safe_ai_doctor.get_medical_response(message, history_data)
+        context.add_user_message(message, safe_ai_doctor._detect_symptoms(message))
+        ai_response = safe_ai_doctor.get_medical_response(message, context.history(), known_symptoms=context.symptoms)
+        # The model's forward pass runs in the analysis pool when one is started
+        model_analysis = analyze_with_model(message)
+        if model_analysis is not None:
+            ai_response = dict(ai_response, model_analysis=model_analysis)
     except Exception as e:
         print(f"Error getting AI response: {e}")
-        return jsonify({
+        chat_contexts.discard(session_id)  # rebuilt from the DB on the next turn
+        return None, ({
             'success': False,
             'error': 'Sorry, I encountered an error. Please try again.'
-        }), 500
+        }, 500)
     
-    # Save AI response
-    ai_message = ChatMessage(
-        session_id=session_id,
-        message_type='ai',
-        content=ai_response['response']
-    )
-    db.session.add(ai_message)
+    # Both messages and the session's last_activity are committed by the
+    # write-behind queue, batched with other requests' turns
+    get_chat_writer().record_turn(session_id, message, ai_response['response'], received_at=received_at)
     
-    # Update session activity
-    chat_session = ChatSession.query.filter_by(session_id=session_id).first()
-    if chat_session:
-        chat_session.last_activity = datetime.utcnow()
-    
-    db.session.commit()
+    return ai_response, None
+
+@app.route('/ai-doctor/send-message', methods=['POST'])
+@login_required
+def send_message():
+    message, session_id, error = read_chat_turn()
+    if not error:
+        ai_response, error = answer_chat_turn(message, session_id)
+    if error:
+        body, status = error
+        return jsonify(body), status
     
     return jsonify({
         'success': True,
         'ai_response': ai_response['response'],
         'medications': ai_response.get('medications', []),
-        'advice': ai_response.get('advice', [])
+        'advice': ai_response.get('advice', []),
+        **model_analysis_fields(ai_response)
     })
 
+@app.route('/ai-doctor/send-message/stream', methods=['POST'])
+@login_required
+def send_message_stream():
+    """Same as send_message, but streams the reply as Server-Sent Events"""
+    message, session_id, error = read_chat_turn()
+    if error:
+        body, status = error
+        return jsonify(body), status
+    
+    def produce():
+        # Runs after the meta event is sent, so the client's first byte does
+        # not wait for the engine
+        ai_response, error = answer_chat_turn(message, session_id)
+        if error:
+            raise StreamError(error[0])
+        return ai_response['response'], {
+            'success': True,
+            'medications': ai_response.get('medications', []),
+            'advice': ai_response.get('advice', []),
+            **model_analysis_fields(ai_response)
+        }
+    
+    return sse_response(stream_with_context(stream_reply({'success': True, 'session_id': session_id}, produce)))
+
 @app.route('/ai-doctor/get-history/<session_id>')
 @login_required
+@read_replica
 def get_chat_history(session_id):
+    # Include turns still queued for writing in this process; turns queued
+    # in other workers are only seen with CHAT_WRITE_DURABLE=1
+    get_chat_writer().flush()
     messages = ChatMessage.query.filter_by(session_id=session_id).order_by(ChatMessage.timestamp).all()
     return jsonify({
         'success': True,
@@ -403,9 +497,17 @@ def ai_doctor_status():
         'success': True,
         'available': safe_ai_doctor is not None,
         'has_methods': hasattr(safe_ai_doctor, 'get_medical_response') if safe_ai_doctor else False,
-        'type': str(type(safe_ai_doctor)) if safe_ai_doctor else 'None'
+        'type': str(type(safe_ai_doctor)) if safe_ai_doctor else 'None',
+        'analysis_pool': get_analysis_pool().get_stats(),
+        'chat_writer': chat_writer.get_stats()
     })
 
+@app.route('/ai-doctor/engines')
+@login_required
+def ai_doctor_engines():
+    """Construction time and memory of the shared engines in this worker"""
+    return jsonify({'success': True, **registry.get_stats()})
+
 # Payment routes
 @app.route('/payment')
 @login_required
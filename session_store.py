@@ -0,0 +1,184 @@
+"""
+Server-side storage for AI Doctor chat history
+
+The browser's session cookie only carries a chat session id; the exchanges
+themselves are appended here one at a time and read back a page at a time.
+Two backends share the same interface:
+
+  SQLiteHistoryStore  a local SQLite file (WAL mode), shared by the worker
+                      processes on one machine
+  RedisHistoryStore   one Redis list per chat session, for several machines
+                      (needs the ``redis`` package, or any client with the
+                      same rpush/lrange/expire API)
+
+create_history_store() picks one from CHAT_HISTORY_STORE, e.g.
+``sqlite:///instance/chat_history.db`` (the default) or
+``redis://localhost:6379/0``.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_STORE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'instance', 'chat_history.db')}"
+
+# History older than this is dropped (seconds)
+DEFAULT_TTL = 30 * 24 * 3600
+
+
+class SQLiteHistoryStore:
+    """
+    Chat history in a SQLite file (WAL mode), one row per exchange.
+
+    Each process and thread opens its own connection, so the store is safe
+    to use from forked workers. Rows are numbered per session (seq 1, 2, ...)
+    and pages are read by seq, so appending never rewrites earlier entries.
+    """
+
+    PRUNE_EVERY = 1024
+
+    def __init__(self, path: str, ttl_seconds: float = DEFAULT_TTL):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS chat_history "
+            "(session_id TEXT NOT NULL, seq INTEGER NOT NULL, entry TEXT NOT NULL, created REAL NOT NULL, "
+            "PRIMARY KEY (session_id, seq)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_chat_history_created ON chat_history (created)")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def append(self, session_id: str, entry: Dict[str, Any]) -> int:
+        """Add one exchange to the end of a session's history; returns its position (1-based)"""
+        conn = self._connect()
+        # The write lock is taken up front, so concurrent writers cannot
+        # take the same seq
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO chat_history (session_id, seq, entry, created) "
+                "SELECT ?, COALESCE(MAX(seq), 0) + 1, ?, ? FROM chat_history WHERE session_id = ?",
+                (session_id, json.dumps(entry), time.time(), session_id)
+            )
+            seq = conn.execute("SELECT MAX(seq) FROM chat_history WHERE session_id = ?", (session_id,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            self.prune()
+        return seq
+
+    def page(self, session_id: str, after: int = 0, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """Up to ``limit`` entries after position ``after``, and the cursor of the next page (None at the end)"""
+        rows = self._connect().execute(
+            "SELECT seq, entry FROM chat_history WHERE session_id = ? AND seq > ? AND created > ? "
+            "ORDER BY seq LIMIT ?",
+            (session_id, after, time.time() - self.ttl_seconds, limit + 1)
+        ).fetchall()
+        entries = [json.loads(entry) for _, entry in rows[:limit]]
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return entries, next_cursor
+
+    def count(self, session_id: str) -> int:
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM chat_history WHERE session_id = ? AND created > ?",
+            (session_id, time.time() - self.ttl_seconds)
+        ).fetchone()[0]
+
+    def clear(self, session_id: str):
+        self._connect().execute("DELETE FROM chat_history WHERE session_id = ?", (session_id,))
+
+    def prune(self):
+        """Drop expired history"""
+        try:
+            self._connect().execute("DELETE FROM chat_history WHERE created <= ?", (time.time() - self.ttl_seconds,))
+        except sqlite3.Error as e:
+            logger.warning(f"Chat history prune failed: {e}")
+
+
+class RedisHistoryStore:
+    """
+    Chat history in Redis, one list per session (``chat_history:<id>``).
+
+    ``client`` is a redis-py client or anything with the same rpush, lrange,
+    llen, expire and delete methods. The list's expiry is renewed on every
+    append, so a session's history lives ``ttl_seconds`` past its last turn.
+    """
+
+    def __init__(self, client, ttl_seconds: float = DEFAULT_TTL, prefix: str = "chat_history:"):
+        self.client = client
+        self.ttl_seconds = int(ttl_seconds)
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisHistoryStore":
+        try:
+            import redis
+        except ImportError:
+            raise ImportError("The redis package is required for a redis:// CHAT_HISTORY_STORE (pip install redis)")
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.prefix}{session_id}"
+
+    def append(self, session_id: str, entry: Dict[str, Any]) -> int:
+        key = self._key(session_id)
+        seq = self.client.rpush(key, json.dumps(entry))
+        self.client.expire(key, self.ttl_seconds)
+        return seq
+
+    def page(self, session_id: str, after: int = 0, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        # Positions are 1-based, list indexes 0-based: entries after ``after``
+        # start at index ``after``; one extra tells whether there is a next page
+        values = self.client.lrange(self._key(session_id), after, after + limit)
+        entries = [json.loads(value) for value in values[:limit]]
+        next_cursor = after + limit if len(values) > limit else None
+        return entries, next_cursor
+
+    def count(self, session_id: str) -> int:
+        return self.client.llen(self._key(session_id))
+
+    def clear(self, session_id: str):
+        self.client.delete(self._key(session_id))
+
+    def prune(self):
+        """Redis expires the lists itself"""
+
+
+def create_history_store(url: Optional[str] = None, ttl_seconds: Optional[float] = None):
+    """History store for a ``sqlite:///path`` or ``redis://`` URL (default: CHAT_HISTORY_STORE)"""
+    url = url or os.environ.get('CHAT_HISTORY_STORE', DEFAULT_STORE_URL)
+    if ttl_seconds is None:
+        ttl_seconds = float(os.environ.get('CHAT_HISTORY_TTL', DEFAULT_TTL))
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisHistoryStore.from_url(url, ttl_seconds=ttl_seconds)
+    if url.startswith('sqlite:///'):
+        path = url[len('sqlite:///'):]
+        if not os.path.isabs(path):
+            path = os.path.join(BASE_DIR, path)
+        return SQLiteHistoryStore(path, ttl_seconds=ttl_seconds)
+    raise ValueError(f"Unsupported CHAT_HISTORY_STORE {url!r} (use sqlite:///path or redis://host:port/db)")
@@ -0,0 +1,77 @@
+import json
+import logging
+import re
+from typing import Callable, Dict, Iterable, Iterator, Tuple
+from flask import Response
+
+logger = logging.getLogger(__name__)
+
+# A word plus the whitespace that follows it
+_WORD_PATTERN = re.compile(r"\S+\s*")
+
+
+def format_event(data: Dict, event: str = None) -> str:
+    """Encode one Server-Sent Event with a JSON payload"""
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def iter_text_chunks(text: str, words_per_chunk: int = 3) -> Iterator[str]:
+    """Split a reply into small chunks of words, keeping the original spacing"""
+    leading = text[:len(text) - len(text.lstrip())]
+    words = _WORD_PATTERN.findall(text)
+    if leading and words:
+        words[0] = leading + words[0]
+    for start in range(0, len(words), words_per_chunk):
+        yield "".join(words[start:start + words_per_chunk])
+
+
+class StreamError(Exception):
+    """Raised by a reply producer to end the stream with an ``error`` event"""
+
+    def __init__(self, payload: Dict):
+        super().__init__(payload.get("error"))
+        self.payload = payload
+
+
+def stream_reply(meta: Dict, produce: Callable[[], Tuple[str, Dict]],
+                 words_per_chunk: int = 3) -> Iterator[str]:
+    """
+    Yield the SSE events for one AI doctor reply
+
+    ``meta`` goes out first, before the reply is computed, so the client
+    gets its first byte without waiting for the engine. ``produce()`` then
+    returns the reply text and its details (response type, diagnosis,
+    ...); the text follows as ``token`` events of a few words each, and a
+    final ``done`` event carries the full reply and the details. If
+    ``produce`` raises StreamError its payload is sent as an ``error``
+    event; any other exception becomes a generic ``error`` event.
+    """
+    yield format_event(meta, "meta")
+    try:
+        text, details = produce()
+    except StreamError as e:
+        yield format_event(e.payload, "error")
+        return
+    except Exception:
+        logger.exception("Streaming reply failed")
+        yield format_event({"error": "Sorry, I encountered an error. Please try again."}, "error")
+        return
+    for chunk in iter_text_chunks(text, words_per_chunk):
+        yield format_event({"text": chunk}, "token")
+    yield format_event(dict(details, response=text), "done")
+
+
+def sse_response(events: Iterable[str]) -> Response:
+    """Wrap an event generator in a streaming text/event-stream response"""
+    return Response(
+        events,
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # disable proxy buffering (nginx)
+        }
+    )
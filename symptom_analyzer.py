@@ -1,83 +1,84 @@
 import random
 from datetime import datetime
+from itertools import islice, repeat
+from knowledge_base import get_knowledge_base
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 class SymptomAnalyzer:
-    def __init__(self):
-        # Define common medical conditions and their associated symptoms
-        self.conditions_database = {
-            'common_cold': {
-                'name': 'Common Cold',
-                'symptoms': ['runny_nose', 'sneezing', 'sore_throat', 'cough', 'congestion', 'mild_fever'],
-                'description': 'A viral infection of the upper respiratory tract that is generally harmless.',
-                'urgency': 'low',
-                'advice': [
-                    'Get plenty of rest and stay hydrated',
-                    'Use over-the-counter pain relievers if needed',
-                    'Try warm salt water gargling for sore throat',
-                    'Consider using a humidifier'
-                ]
-            },
-            'influenza': {
-                'name': 'Influenza (Flu)',
-                'symptoms': ['fever', 'fatigue', 'muscle_aches', 'headache', 'cough', 'sore_throat'],
-                'description': 'A viral infection that attacks the respiratory system with more severe symptoms than a cold.',
-                'urgency': 'medium',
-                'advice': [
-                    'Rest and stay well-hydrated',
-                    'Consider antiviral medication if within 48 hours of symptom onset',
-                    'Monitor fever and seek care if it persists',
-                    'Avoid contact with others to prevent spread'
-                ]
-            },
-            'gastroenteritis': {
-                'name': 'Gastroenteritis',
-                'symptoms': ['nausea', 'vomiting', 'diarrhea', 'abdominal_pain', 'fever', 'fatigue'],
-                'description': 'Inflammation of the stomach and intestines, often called stomach flu.',
-                'urgency': 'medium',
-                'advice': [
-                    'Stay hydrated with clear fluids',
-                    'Follow the BRAT diet (bananas, rice, applesauce, toast)',
-                    'Avoid dairy and fatty foods temporarily',
-                    'Seek care if symptoms worsen or persist'
-                ]
-            },
-            'migraine': {
-                'name': 'Migraine Headache',
-                'symptoms': ['headache', 'nausea', 'dizziness', 'sensitivity_to_light'],
-                'description': 'A type of headache that can cause severe throbbing pain, usually on one side of the head.',
-                'urgency': 'medium',
-                'advice': [
-                    'Rest in a quiet, dark room',
-                    'Apply cold or warm compress to head or neck',
-                    'Stay hydrated and maintain regular sleep schedule',
-                    'Consider over-the-counter pain relievers'
-                ]
-            },
-            'anxiety_disorder': {
-                'name': 'Anxiety',
-                'symptoms': ['anxiety', 'difficulty_sleeping', 'fatigue', 'muscle_tension', 'headache'],
-                'description': 'A mental health condition characterized by excessive worry and physical symptoms.',
-                'urgency': 'medium',
-                'advice': [
-                    'Practice deep breathing and relaxation techniques',
-                    'Maintain regular exercise and sleep schedule',
-                    'Limit caffeine and alcohol intake',
-                    'Consider speaking with a mental health professional'
-                ]
-            },
-            'respiratory_infection': {
-                'name': 'Respiratory Infection',
-                'symptoms': ['cough', 'shortness_of_breath', 'chest_pain', 'fever', 'fatigue'],
-                'description': 'An infection affecting the respiratory system that may require medical attention.',
-                'urgency': 'high',
-                'advice': [
-                    'Seek medical attention promptly',
-                    'Monitor breathing difficulty',
-                    'Rest and stay hydrated',
-                    'Avoid strenuous activities'
-                ]
-            }
-        }
+    def __init__(self, knowledge_base=None):
+        # Common medical conditions and their associated symptoms
+        # (data/knowledge_base.json, shared through its compiled snapshot)
+        self.knowledge_base = knowledge_base or get_knowledge_base()
+        self.conditions_database = self.knowledge_base.conditions
+        self.condition_ids = self.knowledge_base.condition_ids
+        # Symptom names interned to column ids when the snapshot was compiled
+        self.symptom_ids = self.knowledge_base.symptom_ids
+        
+        self.condition_matrix, self.condition_sizes = self.knowledge_base.derived(
+            'conditions.matrix', self._build_condition_matrix
+        )
+    
+    def refreshed(self):
+        """This analyzer, or a new one if the knowledge base has changed since it was built"""
+        knowledge_base = get_knowledge_base()
+        return self if knowledge_base is self.knowledge_base else type(self)(knowledge_base)
+    
+    def _build_condition_matrix(self):
+        """Precompute the condition x symptom incidence matrix used for scoring"""
+        if np is None:
+            return None, None
+        
+        # The snapshot's membership arrays give each condition's symptom ids
+        indptr = np.frombuffer(self.knowledge_base.membership_indptr, dtype=np.uint32)
+        indices = np.frombuffer(self.knowledge_base.membership_indices, dtype=np.uint32)
+        counts = np.diff(indptr)
+        condition_matrix = np.zeros((len(self.condition_ids), len(self.symptom_ids)), dtype=np.float32)
+        condition_matrix[np.repeat(np.arange(len(self.condition_ids)), counts), indices] = 1.0
+        
+        # Probability is relative to the full symptom list, duplicates included
+        return condition_matrix, counts.astype(np.float64)
+    
+    def _rank_conditions(self, symptoms, limit=3):
+        """Return the top (condition_id, probability) pairs, best first"""
+        if self.condition_matrix is None:
+            condition_scores = {}
+            for condition_id, condition_data in self.conditions_database.items():
+                score = self._calculate_condition_probability(symptoms, condition_data['symptoms'])
+                if score > 0:
+                    condition_scores[condition_id] = score
+            return sorted(condition_scores.items(), key=lambda x: x[1], reverse=True)[:limit]
+        
+        user_vector = np.zeros(len(self.symptom_ids), dtype=np.float32)
+        columns = [self.symptom_ids[s] for s in symptoms if s in self.symptom_ids]
+        user_vector[columns] = 1.0
+        
+        matches = (self.condition_matrix @ user_vector).astype(np.float64)
+        scores = self._probabilities(matches, self.condition_sizes)
+        return [(self.condition_ids[i], float(scores[i])) for i in self._top_indices(scores, limit)]
+    
+    @staticmethod
+    def _probabilities(matches, sizes):
+        """Vectorized form of _calculate_condition_probability"""
+        scores = matches / np.maximum(sizes, 1.0)
+        scores = scores + np.where(matches >= 3, 0.1, 0.0)
+        return np.minimum(scores, 1.0)
+    
+    @staticmethod
+    def _top_indices(scores, limit):
+        """Indices of the highest positive scores, ties kept in catalogue order"""
+        if len(scores) > limit:
+            # argpartition only fixes the cut-off score; every condition tied
+            # with it stays in play so ties resolve like a stable sort
+            cutoff = scores[np.argpartition(-scores, limit - 1)[:limit]].min()
+            candidates = np.flatnonzero((scores >= cutoff) & (scores > 0))
+        else:
+            candidates = np.flatnonzero(scores > 0)
+        order = np.lexsort((candidates, -scores[candidates]))
+        return candidates[order][:limit]
     
     def analyze_symptoms(self, symptoms, age=30, gender='other', severity='mild'):
         """
@@ -86,17 +87,85 @@ class SymptomAnalyzer:
         if not symptoms:
             return self._get_default_response()
         
-        # Calculate condition probabilities
-        condition_scores = {}
+        # Score every condition at once and keep the best matches
+        top_conditions = self._rank_conditions(symptoms)
         
-        for condition_id, condition_data in self.conditions_database.items():
-            score = self._calculate_condition_probability(symptoms, condition_data['symptoms'])
-            if score > 0:
-                condition_scores[condition_id] = score
+        return self._build_response(symptoms, top_conditions, age, severity)
+    
+    def analyze_many(self, symptom_lists, ages=None, genders=None, severities=None, batch_size=256):
+        """
+        Analyze many symptom lists, yielding one result per row in input order
         
-        # Sort conditions by probability
-        sorted_conditions = sorted(condition_scores.items(), key=lambda x: x[1], reverse=True)
+        Every argument may be a list or any iterable, including a generator
+        fed from a streaming query over the Consultation table. ages, genders
+        and severities may also be a single value applied to every row. Rows
+        are scored batch_size at a time with one matrix product per batch,
+        so memory stays flat however long the input is. Each result has the
+        same shape as analyze_symptoms. Empty or None rows get the default
+        response; per-row ages, genders or severities must have one value
+        per symptom list, otherwise ValueError is raised.
+        """
+        rows = self._rows(symptom_lists, ages=(ages, 30), genders=(genders, 'other'),
+                          severities=(severities, 'mild'))
         
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            
+            ranked = self._rank_conditions_batch([symptoms or () for symptoms, _, _, _ in batch])
+            for (symptoms, age, gender, severity), top_conditions in zip(batch, ranked):
+                if not symptoms:
+                    yield self._get_default_response()
+                else:
+                    yield self._build_response(symptoms, top_conditions, age, severity)
+    
+    def _rows(self, symptom_lists, **columns):
+        """Zip symptom_lists with the broadcast columns, checking per-row lengths match"""
+        iterators = [(name, self._broadcast(values, default)) for name, (values, default) in columns.items()]
+        count = 0
+        for symptoms in symptom_lists:
+            values = []
+            for name, values_iter in iterators:
+                try:
+                    values.append(next(values_iter))
+                except StopIteration:
+                    raise ValueError(f"{name} has fewer values than symptom_lists ({count})") from None
+            count += 1
+            yield (symptoms, *values)
+        end = object()
+        for name, values_iter in iterators:
+            if not isinstance(values_iter, repeat) and next(values_iter, end) is not end:
+                raise ValueError(f"{name} has more values than symptom_lists ({count})")
+    
+    @staticmethod
+    def _broadcast(values, default):
+        """Turn a per-row iterable, a single value or None into an iterator"""
+        if values is None:
+            return repeat(default)
+        if isinstance(values, (str, int, float)):
+            return repeat(values)
+        return iter(values)
+    
+    def _rank_conditions_batch(self, symptom_lists, limit=3):
+        """Rank conditions for a batch of symptom lists with one matrix product"""
+        if self.condition_matrix is None:
+            return [self._rank_conditions(symptoms, limit) for symptoms in symptom_lists]
+        
+        user_matrix = np.zeros((len(symptom_lists), len(self.symptom_ids)), dtype=np.float32)
+        for row, symptoms in enumerate(symptom_lists):
+            columns = [self.symptom_ids[s] for s in symptoms if s in self.symptom_ids]
+            user_matrix[row, columns] = 1.0
+        
+        matches = (user_matrix @ self.condition_matrix.T).astype(np.float64)
+        scores = self._probabilities(matches, self.condition_sizes)
+        return [
+            [(self.condition_ids[i], float(row_scores[i])) for i in self._top_indices(row_scores, limit)]
+            for row_scores in scores
+        ]
+    
+    def _build_response(self, symptoms, top_conditions, age, severity):
+        """Assemble the analysis result for one set of symptoms"""
         # Generate response
         response = {
             'disclaimer': 'This assessment is for informational purposes only and does not constitute medical advice. Please consult with a healthcare professional for proper diagnosis and treatment.',
@@ -106,7 +175,7 @@ class SymptomAnalyzer:
         }
         
         # Add top matching conditions
-        for condition_id, probability in sorted_conditions[:3]:
+        for condition_id, probability in top_conditions:
             condition = self.conditions_database[condition_id].copy()
             condition['probability'] = probability
             condition['common_symptoms'] = [s for s in symptoms if s in condition['symptoms']]
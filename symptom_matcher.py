@@ -0,0 +1,162 @@
+import re
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+class PhraseMatcher:
+    """
+    Aho-Corasick automaton that finds every occurrence of a fixed set of
+    phrases in a single pass over the text.
+
+    Matching is substring based (like ``phrase in text``), so overlapping
+    phrases such as "stomach" and "stomach upset" are both reported.
+    Each phrase maps to one or more labels; ``find`` returns the set of
+    labels whose phrases occur anywhere in the text.
+    """
+
+    def __init__(self, phrases: Dict[str, Iterable[str]] = None):
+        # State 0 is the root; each state has a goto table, a failure link
+        # and the labels emitted when the state is reached
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[frozenset] = [frozenset()]
+        self._pending: List[Set[str]] = [set()]
+        self.phrase_count = 0
+
+        if phrases:
+            for phrase, labels in phrases.items():
+                self.add(phrase, labels)
+        self.build()
+
+    def add(self, phrase: str, labels: Iterable[str]):
+        """Register a phrase; call ``build`` once all phrases are added"""
+        if not phrase:
+            return
+        state = 0
+        for char in phrase:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(frozenset())
+                self._pending.append(set())
+            state = next_state
+        self._pending[state].update(labels)
+        self.phrase_count += 1
+
+    def build(self):
+        """Compute failure links and merge outputs along them (BFS order)"""
+        queue = []
+        for state in self._goto[0].values():
+            self._fail[state] = 0
+            queue.append(state)
+
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                queue.append(next_state)
+
+        # Parents are visited before children, so the failure target's
+        # output is already complete when a state is merged
+        self._output[0] = frozenset(self._pending[0])
+        for state in queue:
+            self._output[state] = frozenset(self._pending[state] | self._output[self._fail[state]])
+
+    def find(self, text: str) -> Set[str]:
+        """Return all labels whose phrases occur in ``text``"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase ``text`` and split it into word tokens in a single pass"""
+    return TOKEN_PATTERN.findall(text.lower().replace("’", "'"))
+
+
+def inflections(token: str) -> List[str]:
+    """Common English inflections of a token (plural, -ing, -ed) and adjective forms (-ish, -y, -ous)"""
+    if len(token) < 3 or not token.isalpha():
+        return []
+    forms = [token + "s", token + "es", token + "ing", token + "ed", token + "ish"]
+    if token.endswith("e"):
+        # ache -> aching, ached, achy
+        forms.extend([token[:-1] + "ing", token[:-1] + "ed", token[:-1] + "y"])
+    if token.endswith("a"):
+        # nausea -> nauseated, nauseous
+        forms.extend([token + "ted", token[:-1] + "ous"])
+    return forms
+
+
+class TokenIndex:
+    """
+    Inverted index from token n-grams to labels.
+
+    Phrases are matched on word boundaries, so "ache" no longer fires inside
+    "headache". The last word of each phrase is also indexed in its common
+    inflected and adjective forms so "coughing" still matches "cough" and
+    "feverish" matches "fever". Lookup cost depends
+    on message length and the longest phrase, not on the number of phrases.
+    """
+
+    def __init__(self, phrases: Dict[str, Iterable[str]] = None, inflect: bool = True):
+        self.inflect = inflect
+        self._index: Dict[Tuple[str, ...], Set[str]] = {}
+        # First token -> n-gram lengths that start with it, longest first
+        self._lengths: Dict[str, List[int]] = {}
+
+        if phrases:
+            for phrase, labels in phrases.items():
+                self.add(phrase, labels)
+
+    def add(self, phrase: str, labels: Iterable[str]):
+        """Index a phrase (and its inflected forms) under ``labels``"""
+        tokens = tokenize(phrase)
+        if not tokens:
+            return
+        labels = set(labels)
+        variants = [tokens]
+        if self.inflect:
+            variants.extend(tokens[:-1] + [form] for form in inflections(tokens[-1]))
+
+        for variant in variants:
+            self._index.setdefault(tuple(variant), set()).update(labels)
+            lengths = self._lengths.setdefault(variant[0], [])
+            if len(variant) not in lengths:
+                lengths.append(len(variant))
+                lengths.sort(reverse=True)
+
+    def find(self, text) -> Set[str]:
+        """Return all labels whose phrases occur in ``text`` (str or tokens)"""
+        tokens = tokenize(text) if isinstance(text, str) else text
+        index = self._index
+        starts = self._lengths
+        found = set()
+        total = len(tokens)
+        for position, token in enumerate(tokens):
+            lengths = starts.get(token)
+            if not lengths:
+                continue
+            for length in lengths:
+                if position + length <= total:
+                    labels = index.get(tuple(tokens[position:position + length]))
+                    if labels:
+                        found |= labels
+        return found
@@ -16,10 +16,13 @@ def test_model_integration():
     
     try:
         # Import the model integration
-        from huggingface_integration import analyze_symptoms_with_model, get_model_status
+        from huggingface_integration import analyze_symptoms_with_model, get_model_status, wait_for_model
         
         print("✅ Successfully imported model integration")
         
+        # The model loads lazily; wait for it so the tests exercise it
+        wait_for_model()
+        
         # Get model status
         status = get_model_status()
         print(f"📊 Model Status: {status['model_type']}")